@@ -0,0 +1,74 @@
+#ifndef CSVRESYNC_H
+#define CSVRESYNC_H
+
+#include <stdint.h>
+#include <string.h>
+
+// Recovers ';'-terminated CSV commands ("8 joints,special,dur,torque;") from
+// serial bytes that are otherwise skipped while resyncing after a damaged
+// binary frame, so control commands sent in that window are not lost.
+// Plain C++ with no Arduino dependency, so it also builds on a host.
+class csvResync {
+public:
+  static const int FIELDS = 11;
+
+  // Feed one byte. When it completes a well-formed command, returns its
+  // start and stores its length (without the ';') in cmdLen; else NULL.
+  const char* feed(uint8_t b, int* cmdLen) {
+    if (b == ';') {
+      int start = commandStart();
+      int len = _len;
+      _len = 0;
+      if (start < 0) return NULL;
+      *cmdLen = len - start;
+      return &_line[start];
+    }
+    if (!isCsvChar(b)) {
+      _len = 0;  // A command never contains this byte
+      return NULL;
+    }
+    if (_len == (int)sizeof(_line)) {
+      // Only the end of the run can belong to a command
+      memmove(_line, _line + 1, --_len);
+    }
+    _line[_len++] = (char)b;
+    return NULL;
+  }
+
+  // True while a possible command has started but not ended
+  bool pending() const { return _len > 0; }
+
+  void reset() { _len = 0; }
+
+private:
+  char _line[96];
+  int _len = 0;
+
+  static bool isCsvChar(uint8_t b) {
+    return (b >= '0' && b <= '9') || b == '.' || b == '-' || b == ',';
+  }
+
+  // Start of the last FIELDS non-empty fields in the buffer, or -1.
+  // Leftover frame bytes that happen to be digits can still run into the
+  // first field; the binary protocol's CRC cannot protect CSV commands.
+  int commandStart() const {
+    int commas = 0;
+    int start = _len;
+    while (start > 0) {
+      if (_line[start - 1] == ',') {
+        if (commas == FIELDS - 1) break;
+        commas++;
+      }
+      start--;
+    }
+    if (commas != FIELDS - 1 || start == _len) return -1;
+    for (int i = start; i < _len; i++) {
+      bool fieldStart = (i == start) || _line[i - 1] == ',';
+      bool fieldEnd = (i == _len - 1) || _line[i + 1] == ',';
+      if (_line[i] == ',' && (fieldStart || fieldEnd)) return -1;  // Empty field
+    }
+    return start;
+  }
+};
+
+#endif
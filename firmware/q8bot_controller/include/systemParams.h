@@ -54,6 +54,21 @@ const unsigned long HEARTBEAT_TIMEOUT = 5000;      // Unpair after 15s no respon
 // Debug mode - default false
 bool debugMode = false;
 
+// Binary joint frame protocol (see python-tools/q8bot/espnow.py)
+// Keyframe: [sync][seq][8 x int16 joints, 0.1 deg][special][uint16 dur][torque][uint16 crc]
+// Delta:    [sync][seq][8 x int8 joint deltas, 0.1 deg][special][torque][uint16 crc]
+// Little-endian; CRC is CRC-16/XMODEM over everything between sync and CRC.
+// Frames are converted back to the CSV command string before forwarding, so
+// the robot firmware is unchanged.
+const uint8_t PROTOCOL_VERSION = 3;
+const uint8_t KEYFRAME_SYNC = 0xA5;
+const int KEYFRAME_SIZE = 24;
+const uint8_t DELTA_SYNC = 0xA7;
+const int DELTA_SIZE = 14;
+uint8_t lastFrameSeq = 0;
+int16_t lastJoints[8];
+bool streamSynced = false;  // Deltas are only applied after a keyframe
+
 // ============================================================================
 // FreeRTOS Data Structures
 // ============================================================================
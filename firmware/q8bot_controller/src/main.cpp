@@ -7,6 +7,7 @@
 // Q8bot-specific Modules
 #include "systemParams.h"
 #include "macStorage.h"
+#include "csvResync.h"
 
 // Initialize global objects
 esp_now_peer_info_t peerInfo;
@@ -61,6 +62,109 @@ void unpair() {
 }
 
 
+uint16_t crc16(const uint8_t* data, int len) {
+  // CRC-16/XMODEM (poly 0x1021, init 0), matches Python's binascii.crc_hqx
+  uint16_t crc = 0;
+  for (int i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int b = 0; b < 8; b++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+    }
+  }
+  return crc;
+}
+
+// Format joint values (0.1 deg units) and flags as the CSV command string
+void jointsToCsv(const int16_t* joints, uint8_t special, uint16_t dur, uint8_t torque,
+                 char* out, size_t outSize) {
+  int n = 0;
+  for (int i = 0; i < 8; i++) {
+    n += snprintf(out + n, outSize - n, "%.1f,", joints[i] / 10.0f);
+  }
+  snprintf(out + n, outSize - n, "%u,%u,%u", special, dur, torque);
+}
+
+// Check a binary frame's CRC
+bool frameCrcOk(const uint8_t* frame, int size) {
+  uint16_t crc = frame[size - 2] | (frame[size - 1] << 8);
+  return crc16(&frame[1], size - 3) == crc;
+}
+
+// Track a valid frame's sequence number.
+// A sequence gap drops the stream until the next keyframe.
+bool checkFrame(const uint8_t* frame, int size) {
+  uint8_t seq = frame[1];
+  if (seq != (uint8_t)(lastFrameSeq + 1)) {
+    queuePrint(MSG_DEBUG, "[PROTO] Sequence gap: %u -> %u\n", lastFrameSeq, seq);
+    streamSynced = false;
+  }
+  lastFrameSeq = seq;
+  return true;
+}
+
+// Serial input with push-back: bytes of a frame that failed its CRC check
+// are put back so the stream can be resynced one byte at a time
+uint8_t rxPending[2 * KEYFRAME_SIZE];
+int rxPendingLen = 0;
+bool rxResyncing = false;  // Skipping bytes until a valid frame or an idle line
+csvResync rxCsv;           // CSV commands found among the skipped bytes
+
+int rxAvailable() {
+  return rxPendingLen + Serial.available();
+}
+
+int rxPeek() {
+  return rxPendingLen ? rxPending[0] : Serial.peek();
+}
+
+uint8_t rxRead() {
+  if (rxPendingLen == 0) return Serial.read();
+  uint8_t b = rxPending[0];
+  memmove(rxPending, rxPending + 1, --rxPendingLen);
+  return b;
+}
+
+// Put back everything after a rejected frame's sync byte
+void rxUnread(const uint8_t* bytes, int len) {
+  memmove(rxPending + len, rxPending, rxPendingLen);
+  memcpy(rxPending, bytes, len);
+  rxPendingLen += len;
+}
+
+// Send a CSV command string to the robot
+void forwardCommand(const char* text, int len) {
+  if (!paired) return;
+  memcpy(sendMsg.data, text, len);
+  sendMsg.data[len] = '\0';
+  sendMsg.msgType = DATA;
+  sendMsg.id = 1;
+  esp_now_send(serverMac, (uint8_t*)&sendMsg, sizeof(sendMsg));
+}
+
+// Convert a keyframe into the CSV command string the robot parses
+bool keyframeToCsv(const uint8_t* frame, char* out, size_t outSize) {
+  if (!checkFrame(frame, KEYFRAME_SIZE)) return false;
+
+  for (int i = 0; i < 8; i++) {
+    lastJoints[i] = (int16_t)(frame[2 + i*2] | (frame[3 + i*2] << 8));
+  }
+  streamSynced = true;
+  jointsToCsv(lastJoints, frame[18], frame[19] | (frame[20] << 8), frame[21], out, outSize);
+  return true;
+}
+
+// Apply a delta frame to the last joints and convert it to a CSV command
+bool deltaToCsv(const uint8_t* frame, char* out, size_t outSize) {
+  if (!checkFrame(frame, DELTA_SIZE) || !streamSynced) return false;
+
+  for (int i = 0; i < 8; i++) {
+    lastJoints[i] += (int8_t)frame[2 + i];
+  }
+  jointsToCsv(lastJoints, frame[10], 0, frame[11], out, outSize);
+  return true;
+}
+
+
 // ============================================================================
 // ESPNOW Callbacks: ISR-Like, Highest Priority
 // ============================================================================
@@ -90,10 +194,51 @@ void commandForwardingTask(void *param) {
   TickType_t lastWake = xTaskGetTickCount();
 
   while (1) {
-    if (Serial.available()) {
-      char c = Serial.peek();
-
-      if (c == 'd') {
+    if (rxAvailable() == 0) {
+      // Idle line: the host is between messages, so the stream is aligned
+      // again, unless a CSV command is still arriving
+      if (!rxCsv.pending()) rxResyncing = false;
+    }
+    else {
+      int c = rxPeek();
+
+      if (c == KEYFRAME_SYNC || c == DELTA_SYNC) {
+        // Binary joint frame: wait until the whole frame has arrived
+        int size = (c == KEYFRAME_SYNC) ? KEYFRAME_SIZE : DELTA_SIZE;
+        if (rxAvailable() >= size) {
+          uint8_t frame[KEYFRAME_SIZE];
+          for (int i = 0; i < size; i++) frame[i] = rxRead();
+          if (!frameCrcOk(frame, size)) {
+            // Drop only the sync byte and rescan the rest for the next frame
+            queuePrint(MSG_DEBUG, "[PROTO] Dropped frame with bad CRC\n");
+            rxUnread(&frame[1], size - 1);
+            rxResyncing = true;
+          } else {
+            rxResyncing = false;
+            rxCsv.reset();
+            bool ok = (c == KEYFRAME_SYNC)
+              ? keyframeToCsv(frame, sendMsg.data, sizeof(sendMsg.data))
+              : deltaToCsv(frame, sendMsg.data, sizeof(sendMsg.data));
+            if (ok && paired) {
+              sendMsg.msgType = DATA;
+              sendMsg.id = 1;
+              esp_now_send(serverMac, (uint8_t*)&sendMsg, sizeof(sendMsg));
+            }
+          }
+        }
+      }
+      else if (rxResyncing || rxPendingLen > 0) {
+        // Bytes of a damaged frame are skipped, never run as commands, but
+        // complete CSV commands among them (e.g. torque off, battery) are
+        // still forwarded
+        while (rxAvailable() && rxPeek() != KEYFRAME_SYNC && rxPeek() != DELTA_SYNC) {
+          int len;
+          const char* cmd = rxCsv.feed(rxRead(), &len);
+          if (cmd != NULL) forwardCommand(cmd, len);
+          if (rxPendingLen == 0 && !rxResyncing) break;
+        }
+      }
+      else if (c == 'd') {
         Serial.read();
         debugMode = !debugMode;
         queuePrint(MSG_INFO, "Debug mode: %s\n", debugMode ? "ON" : "OFF");
@@ -105,6 +250,14 @@ void commandForwardingTask(void *param) {
         unpair();
       }
 #endif
+      else if (c == ',') {
+        // Protocol probe ",,,,;". Older firmware forwards it and the robot
+        // moves to stale joint targets, so the host only sends it when asked
+        // to negotiate (protocol 'auto')
+        char probe[16];
+        Serial.readBytesUntil(';', probe, sizeof(probe));
+        queuePrint(MSG_INFO, "[PROTO] %u\n", PROTOCOL_VERSION);
+      }
       else if (paired) {
         // Forward joint commands to robot
         int bytesRead = Serial.readBytesUntil(';', sendMsg.data, sizeof(sendMsg.data) - 1);
@@ -121,6 +121,7 @@ JOYSTICK_MOVEMENT = {
     'forward_backward_axis': 1,      # axis[1]: -1 = forward, +1 = backward
     'left_right_axis': 0,             # axis[0]: -1 = left, +1 = right
     'analog_mode': True,              # Analog stride control enabled
+    'continuous_stride': False,       # Blend per-leg stride continuously instead of fixed turn levels
 }
 
 # =============================================================================
@@ -297,3 +298,37 @@ def get_joystick_direction(axis0, axis1, analog_mode=False):
         else:
             # Turning is dominant - use full turn mode
             return 'l' if axis0 < 0 else 'r'
+
+
+def get_joystick_leg_scales(axis0, axis1):
+    """
+    Map joystick axes to a continuous stride scale for each leg.
+
+    The stick is treated as a differential drive: the forward component
+    drives all legs, the turn component is added to the left legs and
+    subtracted from the right legs. Scales are then normalized so the
+    fastest leg matches the stick deflection.
+
+    NOTE: axis0 is left/right, axis1 is forward/backward
+
+    Args:
+        axis0: float, left/right axis value (negative = left, positive = right)
+        axis1: float, forward/backward axis value (negative = forward, positive = backward)
+
+    Returns:
+        tuple: Stride scales (FL, FR, BL, BR) in [-1.0, 1.0], or None if no input
+    """
+    if axis0 == 0 and axis1 == 0:
+        return None
+
+    forward = -axis1
+    turn = axis0
+    left = forward + turn
+    right = forward - turn
+
+    magnitude = min(1.0, max(abs(forward), abs(turn)))
+    peak = max(abs(left), abs(right))
+    if peak > 0:
+        left, right = left / peak * magnitude, right / peak * magnitude
+
+    return (left, right, left, right)
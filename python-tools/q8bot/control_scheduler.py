@@ -0,0 +1,155 @@
+'''
+Fixed-rate control scheduler for Q8bot.
+Runs the control step (gait tick and command send) on its own thread at a
+precise rate, independent of how long the UI takes to render.
+'''
+
+import threading
+import time
+from collections import deque
+import numpy as np
+from helpers import Q8Logger
+
+
+class ControlScheduler:
+    """
+    Calls a function at a fixed rate on a background thread.
+
+    Tick deadlines are start + k * period on the monotonic clock, so timing
+    errors never accumulate. Each wait sleeps until the deadline. Where the
+    OS sleep resolution is coarse (e.g. Windows), a spin_time makes it sleep
+    until shortly before the deadline and spin for the rest; spinning holds
+    the GIL, so other Python threads stall for up to spin_time every tick.
+    When a step overruns by more than a full period the missed ticks are
+    skipped instead of sent in a burst. A failing callback is logged once
+    when it starts failing, then at most once per error_log_interval.
+    """
+
+    def __init__(self, rate_hz, callback, spin_time=0.0, history=2000, name='Q8Control',
+                 error_log_interval=1.0):
+        """
+        Initialize the scheduler.
+
+        Args:
+            rate_hz: Control rate in Hz
+            callback: Function called with no arguments once per tick
+            spin_time: Seconds before each deadline to stop sleeping and spin instead
+                       (0 = never spin)
+            history: Number of recent ticks kept for the jitter statistics
+            name: Name of the scheduler thread
+            error_log_interval: Minimum seconds between logs of repeated callback failures
+        """
+        self.period = 1.0 / rate_hz
+        self.callback = callback
+        self.spin_time = spin_time
+        self.name = name
+        self.error_log_interval = error_log_interval
+        self.lateness = deque(maxlen=history)  # seconds each tick started after its deadline
+        self.period_error = deque(maxlen=history)  # seconds each tick-to-tick interval differed from schedule
+        self.tick_count = 0
+        self.skipped = 0
+        self.errors = 0
+        self._error_streak = 0  # Consecutive failed ticks
+        self._error_logged_at = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Start calling the callback. Does nothing if already running."""
+        if self._thread is not None:
+            return True
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout=1.0):
+        """
+        Stop the scheduler after the current tick.
+
+        Returns:
+            bool: True if the thread stopped within timeout
+        """
+        if self._thread is None:
+            return True
+        self._running = False
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        stopped = not self._thread.is_alive()
+        self._thread = None
+        return stopped
+
+    def is_running(self):
+        """Check if the scheduler thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def jitter_stats(self):
+        """
+        Summarize the timing of recent ticks.
+
+        The period error is how far each tick-to-tick interval was from the
+        scheduled one (one period, or more after skipped ticks), in either
+        direction. Lateness is how long after its deadline each tick started.
+
+        Returns:
+            dict: period_ms, ticks, skipped, errors, and p50, p99 and max of
+                  the absolute period error (period_err_p50_ms, ...) and the
+                  lateness (late_p50_ms, ...), in ms (None until measured)
+        """
+        stats = {'period_ms': self.period * 1000, 'ticks': self.tick_count,
+                 'skipped': self.skipped, 'errors': self.errors}
+        for prefix, samples in (('period_err', self.period_error), ('late', self.lateness)):
+            stats.update({f'{prefix}_p50_ms': None, f'{prefix}_p99_ms': None, f'{prefix}_max_ms': None})
+            if samples:
+                values = np.abs(np.array(samples)) * 1000
+                stats[f'{prefix}_p50_ms'] = float(np.percentile(values, 50))
+                stats[f'{prefix}_p99_ms'] = float(np.percentile(values, 99))
+                stats[f'{prefix}_max_ms'] = float(values.max())
+        return stats
+
+    def _run(self):
+        """Scheduler thread: wait for each deadline, then run the callback."""
+        deadline = time.monotonic()
+        prev_start = prev_deadline = None
+        while self._running:
+            remaining = deadline - time.monotonic()
+            if remaining > self.spin_time:
+                time.sleep(remaining - self.spin_time)
+            if self.spin_time > 0:
+                while time.monotonic() < deadline:
+                    pass
+
+            start = time.monotonic()
+            self.lateness.append(start - deadline)
+            if prev_start is not None:
+                self.period_error.append((start - prev_start) - (deadline - prev_deadline))
+            prev_start, prev_deadline = start, deadline
+            try:
+                self.callback()
+            except Exception as e:
+                self._log_error(e)
+            else:
+                if self._error_streak > 1:
+                    Q8Logger.info(f"Control step recovered after {self._error_streak} failures")
+                self._error_streak = 0
+            self.tick_count += 1
+
+            deadline += self.period
+            behind = time.monotonic() - deadline
+            if behind > self.period:
+                missed = int(behind // self.period)
+                deadline += missed * self.period
+                self.skipped += missed
+
+    def _log_error(self, error):
+        """Count a callback failure; log the first of a streak, then at most once per error_log_interval."""
+        self.errors += 1
+        self._error_streak += 1
+        now = time.monotonic()
+        if self._error_streak == 1:
+            Q8Logger.error(f"Control step failed: {error}")
+        elif now - self._error_logged_at >= self.error_log_interval:
+            Q8Logger.error(f"Control step failed {self._error_streak} times in a row: {error}")
+        else:
+            return
+        self._error_logged_at = now
@@ -0,0 +1,221 @@
+'''
+Streaming recorder for data recorded on the robot.
+After finish_recording(), the robot sends its recorded samples in chunks of
+100 uint16 values, which the controller prints one chunk per line. The last
+chunk is zero padded. Samples are reassembled per recording session into
+preallocated buffers and written as append-only chunked .npy files, so memory
+use stays constant however long the session is, and sessions load instantly
+through memory mapping.
+
+Session directory layout:
+    meta.json         sample_width, sample/chunk counts, wall-clock start time
+    data_00000.npy    (chunk_samples x sample_width) uint16 samples
+    times_00000.npy   (chunk_samples,) float64 arrival time (s) of the line
+                      each sample came in on. The robot only sends its data
+                      after the recording has finished, so these order the
+                      samples but are not the times they were recorded at;
+                      the robot records one sample per recorded motion command.
+'''
+
+import json
+import os
+import threading
+import time
+import numpy as np
+from helpers import Q8Logger
+
+DEFAULT_RECORD_DIR = os.path.join(os.path.expanduser('~'), '.q8bot', 'recordings')
+
+# Values per recorded sample (robot firmware smallerSize): current + 10000 and
+# position for each of the first two joints
+SAMPLE_WIDTH = 4
+# Values per chunk sent by the robot
+CHUNK_VALUES = 100
+
+
+class DataRecorder:
+    """
+    Reassembles recorded data chunks into sessions stored as chunked .npy files.
+    """
+
+    def __init__(self, out_dir=DEFAULT_RECORD_DIR, sample_width=SAMPLE_WIDTH, chunk_samples=4096):
+        """
+        Initialize the recorder.
+
+        Args:
+            out_dir: Directory that session directories are created in
+            sample_width: Number of values per recorded sample
+            chunk_samples: Samples per .npy file (and size of the in-memory buffer)
+        """
+        self.out_dir = out_dir
+        self.sample_width = sample_width
+        self.chunk_samples = chunk_samples
+        self.session_dir = None
+        self.sessions = []  # Completed session directories
+        self._lock = threading.Lock()
+        self._data = np.zeros((chunk_samples, sample_width), dtype=np.uint16)
+        self._times = np.zeros(chunk_samples, dtype=np.float64)
+        self._carry = np.zeros(sample_width, dtype=np.uint16)  # Partial sample between chunks
+        self._carry_count = 0
+        self._fill = 0
+        self._chunk_index = 0
+        self._samples = 0
+        self._last_feed = 0.0
+        self._start_wall = 0.0
+
+    def handle_record(self, record):
+        """Telemetry callback: feed 'data' records from q8_espnow's reader thread."""
+        if record['type'] == 'data':
+            self.feed(record['values'])
+
+    def feed(self, values, timestamp=None):
+        """
+        Add one chunk of recorded values, starting a session if none is open.
+
+        Every recorded sample holds a current + 10000 value, so an all-zero
+        sample can only be the padding after the end of a dump. A chunk with
+        padding is the last one and closes the session; a dump that exactly
+        fills its last chunk is closed by end_if_idle.
+
+        Args:
+            values: Recorded ints from one data line, padding included
+            timestamp: Arrival time in seconds (defaults to time.time())
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        values = np.asarray(values, dtype=np.uint16)
+        if len(values) < CHUNK_VALUES:
+            values = np.concatenate((values, np.zeros(CHUNK_VALUES - len(values), dtype=np.uint16)))
+        with self._lock:
+            if self.session_dir is None:
+                if not values.any():
+                    return  # Padding with no dump to end
+                self._begin(timestamp)
+            self._last_feed = time.monotonic()
+
+            if self._carry_count:
+                values = np.concatenate((self._carry[:self._carry_count], values))
+            whole = len(values) // self.sample_width
+            samples = values[:whole * self.sample_width].reshape(whole, self.sample_width)
+            recorded = np.flatnonzero(samples.any(axis=1))
+            count = recorded[-1] + 1 if len(recorded) else 0
+            last = count < whole
+
+            if last:
+                self._carry_count = 0  # Only padding follows
+            else:
+                self._carry_count = len(values) - whole * self.sample_width
+                self._carry[:self._carry_count] = values[whole * self.sample_width:]
+            self._append(samples[:count], timestamp)
+
+            if last:
+                self._end()
+
+    def feed_line(self, line, timestamp=None):
+        """Parse a raw data line of space-separated ints and feed it."""
+        self.feed(np.array(line.split(), dtype=np.int64), timestamp)
+
+    def end_session(self):
+        """
+        Flush and close the current session.
+
+        Returns:
+            str: Session directory, or None if no session was open
+        """
+        with self._lock:
+            return self._end()
+
+    def end_if_idle(self, timeout=1.0):
+        """
+        Close the session if no data arrived for timeout seconds.
+        Needed when a dump's size is an exact multiple of CHUNK_VALUES.
+
+        Returns:
+            str: Session directory if one was closed, else None
+        """
+        with self._lock:
+            if self.session_dir is not None and time.monotonic() - self._last_feed > timeout:
+                return self._end()
+        return None
+
+    @staticmethod
+    def load_session(session_dir, mmap=True):
+        """
+        Load a recorded session.
+
+        Args:
+            session_dir: Session directory written by DataRecorder
+            mmap: Memory-map the chunk files instead of reading them
+
+        Returns:
+            tuple: (data (n x sample_width) uint16, times (n,) float64, meta dict)
+        """
+        with open(os.path.join(session_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        mode = 'r' if mmap else None
+        chunks = range(meta['chunks'])
+        data = [np.load(os.path.join(session_dir, f"data_{i:05d}.npy"), mmap_mode=mode) for i in chunks]
+        times = [np.load(os.path.join(session_dir, f"times_{i:05d}.npy"), mmap_mode=mode) for i in chunks]
+        if len(data) == 1:
+            return data[0], times[0], meta
+        if not data:
+            return (np.zeros((0, meta['sample_width']), dtype=np.uint16),
+                    np.zeros(0, dtype=np.float64), meta)
+        return np.concatenate(data), np.concatenate(times), meta
+
+    #-------------------#
+    # Private Functions #
+    #-------------------#
+
+    def _begin(self, timestamp):
+        """Open a new session directory. Caller must hold self._lock."""
+        name = time.strftime('session_%Y%m%d_%H%M%S', time.localtime(timestamp))
+        path = os.path.join(self.out_dir, name)
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(self.out_dir, f"{name}_{suffix}")
+            suffix += 1
+        os.makedirs(path)
+        self.session_dir = path
+        self._start_wall = timestamp
+        self._fill = 0
+        self._chunk_index = 0
+        self._samples = 0
+        self._carry_count = 0
+
+    def _append(self, samples, timestamp):
+        """Copy samples into the buffer, writing a chunk file whenever it fills."""
+        while len(samples):
+            count = min(len(samples), self.chunk_samples - self._fill)
+            self._data[self._fill:self._fill + count] = samples[:count]
+            self._times[self._fill:self._fill + count] = timestamp
+            self._fill += count
+            self._samples += count
+            samples = samples[count:]
+            if self._fill == self.chunk_samples:
+                self._write_chunk()
+
+    def _write_chunk(self):
+        """Write the filled part of the buffer as the next chunk file."""
+        if self._fill == 0:
+            return
+        np.save(os.path.join(self.session_dir, f"data_{self._chunk_index:05d}.npy"), self._data[:self._fill])
+        np.save(os.path.join(self.session_dir, f"times_{self._chunk_index:05d}.npy"), self._times[:self._fill])
+        self._chunk_index += 1
+        self._fill = 0
+
+    def _end(self):
+        """Flush the buffer and write meta.json. Caller must hold self._lock."""
+        if self.session_dir is None:
+            return None
+        self._write_chunk()
+        meta = {'sample_width': self.sample_width, 'samples': self._samples,
+                'chunks': self._chunk_index, 'start_time': self._start_wall,
+                'dropped_values': self._carry_count}
+        with open(os.path.join(self.session_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        session_dir = self.session_dir
+        self.sessions.append(session_dir)
+        self.session_dir = None
+        self._carry_count = 0
+        Q8Logger.info(f"Saved {meta['samples']} recorded samples to {session_dir}")
+        return session_dir
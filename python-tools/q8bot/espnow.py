@@ -6,58 +6,114 @@ Python class that passes arguments to connected ESP32C3 controller, which
 then sends commands wirelessly to the robot via ESPNow.
 '''
 
+import binascii
+import struct
+import threading
+import time
+from collections import deque
 import serial
 
 DEFAULT_JOINTLIST = [i + 11 for i in range(8)]
 
+# Binary joint frames, little-endian, each ending in a uint16 CRC-16/XMODEM
+# (binascii.crc_hqx) over everything between the sync byte and the CRC.
+# Keyframe (controller firmware protocol >= 2):
+#   sync, seq, 8 x int16 joints in 0.1 deg, special, uint16 dur, torque
+# Delta frame (protocol >= 3), change since the previous frame:
+#   sync, seq, 8 x int8 joint deltas in 0.1 deg, special, torque
+KEYFRAME_SYNC = 0xA5
+KEYFRAME_BODY = struct.Struct('<BB8hBHB')
+DELTA_SYNC = 0xA7
+DELTA_BODY = struct.Struct('<BB8bBB')
+FRAME_CRC = struct.Struct('<H')
+KEYFRAME_SIZE = KEYFRAME_BODY.size + FRAME_CRC.size
+DELTA_SIZE = DELTA_BODY.size + FRAME_CRC.size
+# Minimum controller protocol version for each serial protocol
+PROTOCOL_VERSIONS = {'csv': 0, 'binary': 2, 'delta': 3}
+# Protocol version probe. Older controller firmware forwards it to the robot,
+# which then moves to its last (or zero-initialised) joint targets, so it is
+# only sent when negotiation is asked for with protocol='auto'.
+PROTOCOL_PROBE = b",,,,;"
+
 class q8_espnow:
-    def __init__(self, port, joint_list = DEFAULT_JOINTLIST, baud = 115200):
-        self.DEVICENAME = port
-        self.BAUDRATE = baud
-        self.JOINTS = joint_list
-        self.prev_pos = [90 for i in range(8)]
-        self.prev_profile = 0
-        self.torque_on = False
+    def __init__(self, port, joint_list = DEFAULT_JOINTLIST, baud = 115200, protocol = 'csv',
+                 keyframe_interval = 50):
+        # protocol: 'csv', 'binary', 'delta', or 'auto' to probe for the best
+        # one the controller supports. Only use 'auto' with controller firmware
+        # that answers the probe (see PROTOCOL_PROBE). keyframe_interval only
+        # applies to 'delta'.
+        self._init_state(port, joint_list, baud)
 
         # Initialize serial communication with ESP32-C3
         self.serialHandler = serial.Serial(self.DEVICENAME, self.BAUDRATE)
 
+        if protocol == 'auto':
+            protocol = self._protocol_for(self.negotiate_protocol())
+        self._set_protocol(protocol, keyframe_interval)
+
+    def negotiate_protocol(self, timeout = 0.5):
+        # Ask the controller for its protocol version. Older firmware never
+        # answers, which is reported as version 0 (CSV only).
+        self._send(PROTOCOL_PROBE)
+        deadline = time.monotonic() + timeout
+        prev_timeout = self.serialHandler.timeout
+        self.serialHandler.timeout = 0.05
+        try:
+            while time.monotonic() < deadline:
+                line = self.serialHandler.readline().decode('utf-8', 'ignore').strip()
+                if line.startswith('[PROTO]'):
+                    try:
+                        return int(line.split()[1])
+                    except (IndexError, ValueError):
+                        return 0
+        finally:
+            self.serialHandler.timeout = prev_timeout
+        return 0
+
     def enable_torque(self):
-        self.serialHandler.write("0,0,0,0,0,0,0,0,0,0,1;".encode())
+        self._write_control(b"0,0,0,0,0,0,0,0,0,0,1;")
         self.torque_on = True
         return True
     
     def disable_torque(self):
-        self.serialHandler.write("0,0,0,0,0,0,0,0,0,0,0;".encode())
+        self._write_control(b"0,0,0,0,0,0,0,0,0,0,0;")
         self.torque_on = False
         return True
     
     def check_battery(self):
-        self.serialHandler.write("0,0,0,0,0,0,0,0,1,0,0;".encode())
+        with self._battery_lock:
+            self._pending_battery += 1
+        self._write_control(b"0,0,0,0,0,0,0,0,1,0,0;")
         return True
     
     def record_data(self):
-        self.serialHandler.write("0,0,0,0,0,0,0,0,2,0,0;".encode())
+        self._write_control(b"0,0,0,0,0,0,0,0,2,0,0;")
         return True
     
     def finish_recording(self):
-        self.serialHandler.write("0,0,0,0,0,0,0,0,3,0,1;".encode())
+        self._write_control(b"0,0,0,0,0,0,0,0,3,0,1;")
         return True
     
     def send_jump(self):
-        self.serialHandler.write("0,0,0,0,0,0,0,0,4,0,0;".encode())
+        self._write_control(b"0,0,0,0,0,0,0,0,4,0,0;")
         return True
 
     def move_all(self, joints_pos, dur = 0, record = True):
         # Expects 8 positions in deg. For example: [0, 90, 0, 90, 0, 90, 0, 90]
-        try:
-            # If record is true, the 9th element is set to value 2. Else 0.
-            cmd = ",".join(map(str, joints_pos)) + f",{record*2}," + f"{dur}," + f"{int(self.torque_on)};" 
-            # print(cmd)
-            self.serialHandler.write(cmd.encode())
-        except:
-            return False
-        return True
+        torque = int(self.torque_on)
+        if self._writer is not None:
+            with self._writer_cond:
+                if not self._coalesce:
+                    self._control_queue.append(('motion', (list(joints_pos), dur, record, torque)))
+                    self._writer_cond.notify()
+                    return True
+                # Latest motion command wins; an unsent older one is replaced
+                if self._motion_slot is not None:
+                    self.writer_counts['coalesced'] += 1
+                self._motion_slot = (list(joints_pos), dur, record, torque)
+                self._writer_cond.notify()
+            return True
+        return self._write_motion(joints_pos, dur, record, torque)
     
     def move_mirror(self, joint_pos, dur = 0):
         # Expects a pair of pos for one leg, which will be mirrored 4times.
@@ -67,6 +123,96 @@ class q8_espnow:
             mirrored_pos.append(joint_pos[1])
         return self.move_all(mirrored_pos, dur, False)
     
+    def start_writer(self, coalesce = True):
+        # Send commands from a background thread so a slow serial link never
+        # blocks the caller. Motion commands share a single "latest wins"
+        # slot, while control commands (torque, battery, jump, record) are
+        # queued in order and never dropped. With coalesce=False motion
+        # commands are queued in order too, e.g. to replay a logged stream.
+        if self._writer is not None:
+            return True
+        self._coalesce = coalesce
+        self._writer_running = True
+        self._writer = threading.Thread(target=self._writer_loop, name='Q8SerialWriter', daemon=True)
+        self._writer.start()
+        return True
+
+    def stop_writer(self, timeout = 1.0):
+        # Send everything still queued, then stop the writer thread
+        if self._writer is None:
+            return True
+        with self._writer_cond:
+            self._writer_running = False
+            self._writer_cond.notify()
+        self._writer.join(timeout)
+        stopped = not self._writer.is_alive()
+        self._writer = None
+        return stopped
+
+    def writer_queue_depth(self):
+        # Number of commands waiting to be written
+        with self._writer_cond:
+            return len(self._control_queue) + (self._motion_slot is not None)
+
+    def start_reader(self, max_records = 1000):
+        # Read and parse incoming serial data on a background thread. Parsed
+        # records (see parse_line) are kept in a bounded queue, oldest dropped
+        # first, and passed to every function in telemetry_callbacks.
+        if self._reader is not None:
+            return True
+        self.telemetry = deque(maxlen = max_records)
+        self._reader_running = True
+        self._reader = threading.Thread(target=self._reader_loop, name='Q8SerialReader', daemon=True)
+        self._reader.start()
+        return True
+
+    def stop_reader(self, timeout = 1.0):
+        if self._reader is None:
+            return True
+        self._reader_running = False
+        self._reader.join(timeout)
+        stopped = not self._reader.is_alive()
+        self._reader = None
+        return stopped
+
+    def poll_telemetry(self):
+        # Return all parsed records received since the last call (never blocks)
+        records = []
+        while True:
+            try:
+                records.append(self.telemetry.popleft())
+            except IndexError:
+                return records
+
+    def parse_line(self, line):
+        # Classify one line from the controller into a telemetry record dict.
+        # Lines of integers are the robot's zero-padded 100-value replies: a
+        # battery level (a single value) if one was requested, otherwise a
+        # chunk of recorded data.
+        record = {'time': time.monotonic()}
+        tokens = line.split()
+        if tokens and all(t.lstrip('-').isdigit() for t in tokens):
+            values = [int(t) for t in tokens]
+            battery = False
+            if not any(values[1:]):
+                with self._battery_lock:
+                    battery = self._pending_battery > 0
+                    if battery:
+                        self._pending_battery -= 1
+            if battery:
+                record.update(type = 'battery', percent = values[0])
+            else:
+                # Kept whole: zeros are only padding where DataRecorder says so
+                record.update(type = 'data', values = values)
+        elif line.startswith('[HEARTBEAT]') and 'RTT:' in line:
+            rtt = line.split('RTT:')[1].strip().rstrip('ms')
+            record.update(type = 'heartbeat', rtt_ms = int(rtt) if rtt.isdigit() else None, text = line)
+        elif line.startswith('[PROTO]'):
+            record.update(type = 'proto', text = line)
+        else:
+            record.update(type = 'text', text = line)
+        return record
+
     def bulkread(self, addr, len = 4):
         value = [0 for i in range(8)]
         return value, True
@@ -100,5 +246,283 @@ class q8_espnow:
     # Private Functions #
     #-------------------#
     
+    def _init_state(self, port, joint_list, baud, max_records = 1000):
+        # Attributes shared with q8_espnow_async. The caller opens the serial
+        # port and then calls _set_protocol.
+        self.DEVICENAME = port
+        self.BAUDRATE = baud
+        self.JOINTS = joint_list
+        self.prev_pos = [90 for i in range(8)]
+        self.prev_profile = 0
+        self.torque_on = False
+
+        # Optional background writer (see start_writer)
+        self._writer = None
+        self._writer_cond = threading.Condition()
+        self._control_queue = deque()
+        self._motion_slot = None
+        self._coalesce = True
+        self.writer_counts = {'sent': 0, 'coalesced': 0, 'errors': 0}
+        self.write_times = deque(maxlen = 1000)  # Seconds spent in each serial write
+
+        # Optional background reader (see start_reader)
+        self._reader = None
+        self._pending_battery = 0  # Battery requests not answered yet
+        self._battery_lock = threading.Lock()  # check_battery runs on the caller's thread
+        self.telemetry = deque(maxlen = max_records)
+        self.telemetry_callbacks = []
+        self.reader_counts = {'lines': 0, 'dropped': 0}
+
+        # Called as callback(kind, joints, special, dur, torque) for every
+        # command written to the serial port, from the thread that writes it,
+        # kind being 'motion' or 'control' (see SessionLogWriter)
+        self.command_callbacks = []
+
+    def _set_protocol(self, protocol, keyframe_interval):
+        self.protocol = protocol
+        self.encoder = JointStreamEncoder(keyframe_interval if protocol == 'delta' else 1)
+
+    def _protocol_for(self, version):
+        # Best serial protocol a controller with this protocol version supports
+        supported = [p for p, v in PROTOCOL_VERSIONS.items() if v <= version]
+        return max(supported, key=PROTOCOL_VERSIONS.get)
+
+    def _send(self, data):
+        start = time.perf_counter()
+        self.serialHandler.write(data)
+        self.write_times.append(time.perf_counter() - start)
+
     def _set_profile(self, dur_ms):
-        return
\ No newline at end of file
+        return
+
+    def _write_control(self, cmd):
+        if self._writer is None:
+            self._send_control(cmd)
+            return
+        with self._writer_cond:
+            # Keep ordering: a pending motion command goes out before this one
+            if self._motion_slot is not None:
+                self._control_queue.append(('motion', self._motion_slot))
+                self._motion_slot = None
+            self._control_queue.append(('control', cmd))
+            self._writer_cond.notify()
+
+    def _write_motion(self, joints_pos, dur, record, torque):
+        if self.protocol in ('binary', 'delta'):
+            return self._write_frame(joints_pos, record*2, dur, torque)
+        try:
+            # If record is true, the 9th element is set to value 2. Else 0.
+            cmd = ",".join(map(str, joints_pos)) + f",{record*2}," + f"{dur}," + f"{torque};" 
+            self._send(cmd.encode())
+        except:
+            return False
+        self._command_sent('motion', joints_pos, record*2, dur, torque)
+        return True
+
+    def _write_frame(self, joints_pos, special, dur, torque):
+        try:
+            frame = self.encoder.encode(joints_pos, special, dur, torque)
+            self._send(frame)
+        except (struct.error, serial.SerialException):
+            return False
+        self._command_sent('motion', joints_pos, special, dur, torque)
+        return True
+
+    def _send_control(self, cmd):
+        self._send(cmd)
+        if self.command_callbacks:
+            fields = cmd[:-1].split(b",")
+            self._command_sent('control', None, int(fields[8]), int(fields[9]), int(fields[10]))
+
+    def _command_sent(self, kind, joints, special, dur, torque):
+        for callback in self.command_callbacks:
+            callback(kind, joints, special, dur, torque)
+
+    def _reader_loop(self):
+        self.serialHandler.timeout = 0.05
+        buffer = bytearray()
+        while self._reader_running:
+            try:
+                chunk = self.serialHandler.read(max(1, self.serialHandler.in_waiting))
+            except serial.SerialException:
+                time.sleep(0.05)
+                continue
+            if not chunk:
+                continue
+            buffer.extend(chunk)
+            while b'\n' in buffer:
+                raw, _, rest = buffer.partition(b'\n')
+                buffer = bytearray(rest)
+                line = raw.decode('utf-8', 'ignore').strip()
+                if not line:
+                    continue
+                record = self.parse_line(line)
+                self.reader_counts['lines'] += 1
+                if len(self.telemetry) == self.telemetry.maxlen:
+                    self.reader_counts['dropped'] += 1
+                self.telemetry.append(record)
+                for callback in self.telemetry_callbacks:
+                    callback(record)
+
+    def _writer_loop(self):
+        while True:
+            with self._writer_cond:
+                while (self._writer_running and not self._control_queue
+                       and self._motion_slot is None):
+                    self._writer_cond.wait()
+                if self._control_queue:
+                    kind, item = self._control_queue.popleft()
+                elif self._motion_slot is not None:
+                    kind, item = 'motion', self._motion_slot
+                    self._motion_slot = None
+                else:
+                    return  # Stopped and fully drained
+
+            if kind == 'motion':
+                ok = self._write_motion(*item)
+            else:
+                try:
+                    self._send_control(item)
+                    ok = True
+                except serial.SerialException:
+                    ok = False
+            self.writer_counts['sent' if ok else 'errors'] += 1
+
+
+class JointStreamEncoder:
+    """
+    Encodes a stream of joint commands as binary frames.
+
+    A keyframe with absolute joint values is sent first, then every
+    keyframe_interval frames, and whenever the duration or torque flag changes
+    or a joint moves more than an int8 delta allows. Every other frame only
+    carries the change since the previous frame. With keyframe_interval = 1
+    every frame is a keyframe. Frames are packed into preallocated buffers, so
+    the returned memoryview is only valid until the next encode() call.
+    """
+
+    def __init__(self, keyframe_interval = 50):
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.seq = 0
+        self.since_keyframe = 0
+        self.prev_joints = None   # Last sent joints in 0.1 deg units
+        self.prev_torque = None
+        self.keyframes = 0
+        self.deltas = 0
+        self._keyframe = bytearray(KEYFRAME_SIZE)
+        self._delta = bytearray(DELTA_SIZE)
+
+    def request_keyframe(self):
+        # Force the next frame to be a keyframe, e.g. after reconnecting
+        self.prev_joints = None
+
+    def encode(self, joints_pos, special = 0, dur = 0, torque = 1):
+        joints = [int(round(p * 10)) for p in joints_pos]
+        self.seq = (self.seq + 1) & 0xFF
+
+        if (self.prev_joints is not None and dur == 0 and torque == self.prev_torque
+                and self.since_keyframe + 1 < self.keyframe_interval):
+            deltas = [j - p for j, p in zip(joints, self.prev_joints)]
+            if all(-128 <= d <= 127 for d in deltas):
+                DELTA_BODY.pack_into(self._delta, 0, DELTA_SYNC, self.seq, *deltas, special, torque)
+                self._pack_crc(self._delta, DELTA_BODY.size)
+                self.prev_joints = joints
+                self.since_keyframe += 1
+                self.deltas += 1
+                return memoryview(self._delta)
+
+        KEYFRAME_BODY.pack_into(self._keyframe, 0, KEYFRAME_SYNC, self.seq, *joints,
+                                special, dur, torque)
+        self._pack_crc(self._keyframe, KEYFRAME_BODY.size)
+        self.prev_joints = joints
+        self.prev_torque = torque
+        self.since_keyframe = 0
+        self.keyframes += 1
+        return memoryview(self._keyframe)
+
+    @staticmethod
+    def _pack_crc(frame, body_size):
+        crc = binascii.crc_hqx(memoryview(frame)[1:body_size], 0)
+        FRAME_CRC.pack_into(frame, body_size, crc)
+
+
+class JointStreamDecoder:
+    """
+    Decodes a byte stream produced by JointStreamEncoder, for tests and replay.
+
+    Bytes can be fed in arbitrary chunks. Noise and frames with a bad CRC are
+    skipped byte by byte until the next sync byte. After a sequence gap, delta
+    frames are dropped until the next keyframe resynchronizes the stream.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.joints = None
+        self.last_seq = None
+        self.synced = False
+        self.gaps = 0
+        self.crc_errors = 0
+        self.dropped = 0
+
+    def feed(self, data):
+        """
+        Decode as many complete frames as possible.
+
+        Returns:
+            list: Decoded commands as dicts with keys 'seq', 'joints' (deg),
+                  'special', 'dur', 'torque' and 'keyframe'
+        """
+        self.buffer.extend(data)
+        commands = []
+        while self.buffer:
+            sync = self.buffer[0]
+            if sync == KEYFRAME_SYNC:
+                body, size = KEYFRAME_BODY, KEYFRAME_SIZE
+            elif sync == DELTA_SYNC:
+                body, size = DELTA_BODY, DELTA_SIZE
+            else:
+                del self.buffer[0]
+                continue
+            if len(self.buffer) < size:
+                break
+
+            frame = bytes(self.buffer[:size])
+            crc, = FRAME_CRC.unpack_from(frame, body.size)
+            if binascii.crc_hqx(frame[1:body.size], 0) != crc:
+                self.crc_errors += 1
+                del self.buffer[0]
+                continue
+            del self.buffer[:size]
+
+            command = self._apply(body.unpack_from(frame), sync == KEYFRAME_SYNC)
+            if command is not None:
+                commands.append(command)
+        return commands
+
+    def _apply(self, fields, keyframe):
+        seq = fields[1]
+        if self.last_seq is not None and seq != (self.last_seq + 1) & 0xFF:
+            self.gaps += 1
+            self.synced = False
+        self.last_seq = seq
+
+        if keyframe:
+            self.joints = list(fields[2:10])
+            special, dur, torque = fields[10:13]
+            self.synced = True
+        else:
+            if not self.synced:
+                self.dropped += 1
+                return None
+            self.joints = [j + d for j, d in zip(self.joints, fields[2:10])]
+            special, torque = fields[10:12]
+            dur = 0
+
+        return {
+            'seq': seq,
+            'joints': [j / 10 for j in self.joints],
+            'special': special,
+            'dur': dur,
+            'torque': torque,
+            'keyframe': keyframe,
+        }
@@ -0,0 +1,218 @@
+'''
+asyncio version of q8_espnow, so a single event loop can drive several robots
+and test fixtures without one thread per serial port. Incoming data is read
+with loop.add_reader on the serial port's file descriptor and parsed into the
+same telemetry records as q8_espnow.start_reader. Outgoing bytes are written
+to the non-blocking descriptor directly; whatever the OS does not accept is
+kept in order and finished with loop.add_writer.
+
+POSIX only: add_reader and add_writer need a real file descriptor and a
+selector event loop, which pyserial's Windows ports and the Windows proactor
+loop do not provide.
+'''
+
+import asyncio
+import os
+import serial
+from espnow import q8_espnow, DEFAULT_JOINTLIST, PROTOCOL_PROBE
+
+class q8_espnow_async(q8_espnow):
+    def __init__(self, port, joint_list = DEFAULT_JOINTLIST, baud = 115200, protocol = 'csv',
+                 keyframe_interval = 50, max_records = 1000, loop = None):
+        # Use q8_espnow_async.open() to also negotiate the protocol. Nothing
+        # here blocks the loop: reads only happen when the loop reports data
+        # and writes never wait for the port (see _send).
+        self._init_state(port, joint_list, baud, max_records)
+        self.serialHandler = serial.Serial(self.DEVICENAME, self.BAUDRATE, timeout = 0,
+                                           write_timeout = 0)
+        self._set_protocol(protocol, keyframe_interval)
+
+        # No writer thread; bytes the OS has not accepted yet wait in _out
+        self._out = bytearray()
+        self._subscribers = []
+        self._buffer = bytearray()
+
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop.add_reader(self.serialHandler.fileno(), self._on_readable)
+
+    @classmethod
+    async def open(cls, port, joint_list = DEFAULT_JOINTLIST, baud = 115200, protocol = 'csv',
+                   keyframe_interval = 50, max_records = 1000):
+        # Open a port and, for protocol='auto', pick the best protocol the
+        # controller supports without blocking the loop.
+        q8 = cls(port, joint_list, baud, 'csv', keyframe_interval, max_records)
+        if protocol == 'auto':
+            q8._set_protocol(q8._protocol_for(await q8.negotiate_protocol()), keyframe_interval)
+        else:
+            q8._set_protocol(protocol, keyframe_interval)
+        return q8
+
+    async def negotiate_protocol(self, timeout = 0.5):
+        # Older firmware never answers the probe, which is reported as 0
+        queue = self._subscribe(10)
+        try:
+            self._send(PROTOCOL_PROBE)
+            while True:
+                record = await asyncio.wait_for(queue.get(), timeout)
+                if record['type'] == 'proto':
+                    try:
+                        return int(record['text'].split()[1])
+                    except (IndexError, ValueError):
+                        return 0
+        except asyncio.TimeoutError:
+            return 0
+        finally:
+            self._subscribers.remove(queue)
+
+    def pending_bytes(self):
+        # Bytes written but not yet accepted by the OS
+        return len(self._out)
+
+    def close(self):
+        # Bytes the OS has not accepted yet are dropped
+        self._loop.remove_reader(self.serialHandler.fileno())
+        if self._out:
+            self._loop.remove_writer(self.serialHandler.fileno())
+            self._out.clear()
+        for queue in self._subscribers:
+            self._publish_to(queue, None)  # Ends open telemetry iterators
+        self.serialHandler.close()
+
+    async def enable_torque(self):
+        q8_espnow.enable_torque(self)
+        await asyncio.sleep(0)
+        return True
+
+    async def disable_torque(self):
+        q8_espnow.disable_torque(self)
+        await asyncio.sleep(0)
+        return True
+
+    async def check_battery(self, timeout = 1.0):
+        # Returns the battery level in percent, or None if there is no reply
+        queue = self._subscribe(10)
+        try:
+            q8_espnow.check_battery(self)
+            while True:
+                record = await asyncio.wait_for(queue.get(), timeout)
+                if record['type'] == 'battery':
+                    return record['percent']
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._subscribers.remove(queue)
+
+    async def record_data(self):
+        q8_espnow.record_data(self)
+        await asyncio.sleep(0)
+        return True
+
+    async def finish_recording(self):
+        q8_espnow.finish_recording(self)
+        await asyncio.sleep(0)
+        return True
+
+    async def send_jump(self):
+        q8_espnow.send_jump(self)
+        await asyncio.sleep(0)
+        return True
+
+    async def move_all(self, joints_pos, dur = 0, record = True):
+        # Expects 8 positions in deg. For example: [0, 90, 0, 90, 0, 90, 0, 90]
+        torque = int(self.torque_on)
+        sent = self._write_motion(joints_pos, dur, record, torque)
+        self.writer_counts['sent' if sent else 'errors'] += 1
+        await asyncio.sleep(0)
+        return sent
+
+    async def move_mirror(self, joint_pos, dur = 0):
+        return await self.move_all(list(joint_pos) * 4, dur, False)
+
+    async def telemetry_stream(self, max_records = 100):
+        # Async iterator over telemetry records received from now on, e.g.
+        #   async for record in q8.telemetry_stream(): ...
+        # A slow consumer loses its oldest records, never the newest.
+        queue = self._subscribe(max_records)
+        try:
+            while True:
+                record = await queue.get()
+                if record is None:
+                    return
+                yield record
+        finally:
+            if queue in self._subscribers:
+                self._subscribers.remove(queue)
+
+    def start_writer(self, coalesce = True):
+        return False  # Writes never block here (see _send)
+
+    def start_reader(self, max_records = 1000):
+        return True  # Reading is already done by the event loop
+
+    def stop_reader(self, timeout = 1.0):
+        return True
+
+    #-------------------#
+    # Private Functions #
+    #-------------------#
+
+    def _subscribe(self, max_records):
+        queue = asyncio.Queue(max_records)
+        self._subscribers.append(queue)
+        return queue
+
+    def _publish_to(self, queue, record):
+        if queue.full():
+            queue.get_nowait()
+            self.reader_counts['dropped'] += 1
+        queue.put_nowait(record)
+
+    def _send(self, data):
+        # Write what the OS accepts now and queue the rest, in order, for
+        # the loop to finish when the port becomes writable again.
+        if self._out:
+            self._out.extend(data)
+            return
+        try:
+            sent = os.write(self.serialHandler.fileno(), data)
+        except BlockingIOError:
+            sent = 0
+        except OSError as e:
+            raise serial.SerialException(f"write failed: {e}")
+        if sent < len(data):
+            self._out.extend(memoryview(data)[sent:])
+            self._loop.add_writer(self.serialHandler.fileno(), self._on_writable)
+
+    def _on_writable(self):
+        try:
+            sent = os.write(self.serialHandler.fileno(), self._out)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.writer_counts['errors'] += 1
+            sent = len(self._out)
+        del self._out[:sent]
+        if not self._out:
+            self._loop.remove_writer(self.serialHandler.fileno())
+
+    def _on_readable(self):
+        try:
+            chunk = self.serialHandler.read(max(1, self.serialHandler.in_waiting))
+        except serial.SerialException:
+            return
+        self._buffer.extend(chunk)
+        while b'\n' in self._buffer:
+            raw, _, rest = self._buffer.partition(b'\n')
+            self._buffer = bytearray(rest)
+            line = raw.decode('utf-8', 'ignore').strip()
+            if not line:
+                continue
+            record = self.parse_line(line)
+            self.reader_counts['lines'] += 1
+            if len(self.telemetry) == self.telemetry.maxlen:
+                self.reader_counts['dropped'] += 1
+            self.telemetry.append(record)
+            for callback in self.telemetry_callbacks:
+                callback(record)
+            for queue in list(self._subscribers):
+                self._publish_to(queue, record)
@@ -0,0 +1,269 @@
+'''
+Fleet control for several Q8bots, one per connected ESP32C3 dongle.
+Every robot gets its own q8_espnow link and GaitManager, while the gait
+trajectories are stored once and shared, since all robots use the same leg
+geometry. A single step() call drives the whole fleet from one loop.
+'''
+
+from collections import deque
+import numpy as np
+from espnow import q8_espnow
+from gait_manager import GaitManager, GAITS
+from helpers import XiaoPortFinder, Q8Logger
+
+
+class FleetRobot:
+    """
+    One robot in a fleet: its serial link, gait state and latency stats.
+    """
+
+    def __init__(self, port, q8, gait_manager, history=1000):
+        """
+        Initialize the robot entry.
+
+        Args:
+            port: Serial port of the robot's ESP32C3 dongle
+            q8: Connected q8_espnow instance
+            gait_manager: GaitManager for this robot
+            history: Number of recent write latencies kept for the stats
+        """
+        self.port = port
+        self.q8 = q8
+        self.gait_manager = gait_manager
+        # Seconds per serial write, timed by q8 where the bytes are written
+        # (on its writer thread once start_writer is called)
+        q8.write_times = deque(maxlen=history)
+        self.rtt_ms = deque(maxlen=history)  # controller heartbeat round trips
+        self.ticks = 0
+        self.errors = 0
+        q8.telemetry_callbacks.append(self._on_telemetry)
+
+    def latency_stats(self):
+        """
+        Summarize this robot's recent latencies.
+
+        Returns:
+            dict: ticks, errors, write_p50_ms, write_p99_ms, write_max_ms (time
+                  spent writing each command to the serial port) and rtt_ms
+                  (mean heartbeat round trip, None if none received)
+        """
+        stats = {'ticks': self.ticks, 'errors': self.errors,
+                 'write_p50_ms': None, 'write_p99_ms': None, 'write_max_ms': None,
+                 'rtt_ms': None}
+        latency = np.array(list(self.q8.write_times)) * 1000  # Copied in one step
+        if len(latency):
+            stats['write_p50_ms'] = float(np.percentile(latency, 50))
+            stats['write_p99_ms'] = float(np.percentile(latency, 99))
+            stats['write_max_ms'] = float(latency.max())
+        rtt = [r for r in self.rtt_ms if r is not None]
+        if rtt:
+            stats['rtt_ms'] = float(np.mean(rtt))
+        return stats
+
+    def _on_telemetry(self, record):
+        """Collect heartbeat round trips reported by the controller."""
+        if record['type'] == 'heartbeat':
+            self.rtt_ms.append(record['rtt_ms'])
+
+
+class Q8Fleet:
+    """
+    Drives several Q8bots from one process and one control loop.
+
+    The fleet offers the q8_espnow command methods (enable_torque,
+    move_mirror, check_battery, ...), applied to every robot, so it can be
+    passed wherever a single q8_espnow is expected, e.g. show_range(fleet).
+    Gait methods (load_gait, start_movement, ...) set every robot's
+    GaitManager, and step() sends each robot its next trajectory row.
+    """
+
+    def __init__(self, leg, ports=None, available_gaits=None, disk_cache=None, protocol='csv'):
+        """
+        Open every robot in the fleet.
+
+        Args:
+            leg: Kinematics solver instance (shared by all robots)
+            ports: Optional list of serial ports (defaults to every connected XIAO dongle)
+            available_gaits: Optional dict of gait definitions (defaults to GAITS)
+            disk_cache: Optional TrajectoryCache shared by all robots
+            protocol: Serial protocol passed to each q8_espnow
+        """
+        if ports is None:
+            ports = XiaoPortFinder.list_all()
+        available_gaits = available_gaits if available_gaits else GAITS
+        self.leg = leg
+        self.robots = []
+        store = None
+        for port in ports:
+            q8 = q8_espnow(port, protocol=protocol)
+            gait_manager = GaitManager(leg, available_gaits, cache_size=len(available_gaits),
+                                       disk_cache=disk_cache, shared_store=store)
+            store = store or gait_manager
+            self.robots.append(FleetRobot(port, q8, gait_manager))
+            Q8Logger.debug(f"Fleet robot on {port} (protocol: {q8.protocol})")
+
+    def __len__(self):
+        return len(self.robots)
+
+    @property
+    def protocol(self):
+        """Serial protocol per port."""
+        return {robot.port: robot.q8.protocol for robot in self.robots}
+
+    @property
+    def writer_counts(self):
+        """Writer counters summed over the fleet."""
+        return self._sum_counts('writer_counts')
+
+    @property
+    def reader_counts(self):
+        """Reader counters summed over the fleet."""
+        return self._sum_counts('reader_counts')
+
+    #-----------------------------#
+    # q8_espnow command interface #
+    #-----------------------------#
+
+    def enable_torque(self):
+        return self._broadcast('enable_torque')
+
+    def disable_torque(self):
+        return self._broadcast('disable_torque')
+
+    def check_battery(self):
+        return self._broadcast('check_battery')
+
+    def record_data(self):
+        return self._broadcast('record_data')
+
+    def finish_recording(self):
+        return self._broadcast('finish_recording')
+
+    def send_jump(self):
+        return self._broadcast('send_jump')
+
+    def move_all(self, joints_pos, dur=0, record=True):
+        return self._broadcast('move_all', joints_pos, dur, record)
+
+    def move_mirror(self, joint_pos, dur=0):
+        return self._broadcast('move_mirror', joint_pos, dur)
+
+    def start_writer(self, coalesce=True):
+        return self._broadcast('start_writer', coalesce)
+
+    def stop_writer(self, timeout=1.0):
+        return self._broadcast('stop_writer', timeout)
+
+    def start_reader(self, max_records=1000):
+        return self._broadcast('start_reader', max_records)
+
+    def stop_reader(self, timeout=1.0):
+        return self._broadcast('stop_reader', timeout)
+
+    def poll_telemetry(self):
+        """Get new telemetry records from every robot, each tagged with its 'port'."""
+        records = []
+        for robot in self.robots:
+            for record in robot.q8.poll_telemetry():
+                record['port'] = robot.port
+                records.append(record)
+        return records
+
+    #------------------------#
+    # Gait manager interface #
+    #------------------------#
+
+    def load_gait(self, gait_name):
+        """Load a gait on every robot; trajectories are calculated only once."""
+        return all([robot.gait_manager.load_gait(gait_name) for robot in self.robots])
+
+    def prefetch_all(self, gait_names=None, on_ready=None, stride_bases=False):
+        """Calculate every gait in the background, once for the whole fleet."""
+        if not self.robots:
+            return None
+        return self.robots[0].gait_manager.prefetch_all(gait_names, on_ready, stride_bases)
+
+    def get_gait_status(self, gait_name, stride_basis=False):
+        """Get a gait's loading state (shared by all robots)."""
+        if not self.robots:
+            return None
+        return self.robots[0].gait_manager.get_gait_status(gait_name, stride_basis)
+
+    def start_movement(self, direction, ports=None):
+        """
+        Start or switch movement direction.
+
+        Args:
+            direction: Direction string (e.g., 'f', 'b', 'fl_0.75')
+            ports: Optional list of ports to apply it to (defaults to every robot)
+
+        Returns:
+            bool: True if movement started on every selected robot
+        """
+        return all([robot.gait_manager.start_movement(direction)
+                    for robot in self._select(ports)])
+
+    def start_analog(self, leg_scales, ports=None):
+        """Start or update continuous per-leg stride movement (see GaitManager.start_analog)."""
+        return all([robot.gait_manager.start_analog(leg_scales)
+                    for robot in self._select(ports)])
+
+    def stop(self, ports=None):
+        """Stop movement on the selected robots (defaults to every robot)."""
+        for robot in self._select(ports):
+            robot.gait_manager.stop()
+
+    def is_moving(self):
+        """Check if any robot is executing a movement."""
+        return any(robot.gait_manager.is_moving() for robot in self.robots)
+
+    def step(self, record=False):
+        """
+        Send every moving robot its next trajectory row. Call once per control tick.
+
+        Args:
+            record: Ask the robots to record this movement
+
+        Returns:
+            int: Number of robots that were sent a command
+        """
+        sent = 0
+        for robot in self.robots:
+            pos = robot.gait_manager.tick()
+            if pos is None:
+                continue
+            ok = robot.q8.move_all(pos, 0, record)
+            robot.ticks += 1
+            if ok:
+                sent += 1
+            else:
+                robot.errors += 1
+        return sent
+
+    def latency_stats(self):
+        """
+        Get latency statistics for every robot.
+
+        Returns:
+            dict: Port to FleetRobot.latency_stats() result
+        """
+        return {robot.port: robot.latency_stats() for robot in self.robots}
+
+    #-------------------#
+    # Private Functions #
+    #-------------------#
+
+    def _select(self, ports):
+        if ports is None:
+            return self.robots
+        return [robot for robot in self.robots if robot.port in ports]
+
+    def _broadcast(self, method, *args):
+        return all([getattr(robot.q8, method)(*args) for robot in self.robots])
+
+    def _sum_counts(self, name):
+        totals = {}
+        for robot in self.robots:
+            for key, value in getattr(robot.q8, name).items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
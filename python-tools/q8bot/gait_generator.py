@@ -6,11 +6,12 @@ This module contains functions for generating and managing gait trajectories.
 '''
 
 import math
+import numpy as np
 # Note: No imports from kinematics_solver needed - leg is passed as parameter
 
 def append_pos_list(list_1, list_2, list_3, list_4):
     """
-    Append values to overall movement list in specific order.
+    Stack four single-leg trajectories into one overall movement array.
 
     Robot layout:
        Front
@@ -18,21 +19,44 @@ def append_pos_list(list_1, list_2, list_3, list_4):
     list_3  list_4
 
     Args:
-        list_1: Front-left leg trajectory
-        list_2: Front-right leg trajectory
-        list_3: Back-left leg trajectory
-        list_4: Back-right leg trajectory
+        list_1: Front-left leg trajectory (n x 2)
+        list_2: Front-right leg trajectory (n x 2)
+        list_3: Back-left leg trajectory (n x 2)
+        list_4: Back-right leg trajectory (n x 2)
 
     Returns:
-        Aggregated position list: [q1_1, q2_1, q1_2, q2_2, q1_3, q2_3, q1_4, q2_4]
+        (n x 8) float32 array with rows [q1_1, q2_1, q1_2, q2_2, q1_3, q2_3, q1_4, q2_4]
     """
-    append_list = []
-    for i in range(len(list_1)):
-        append_list.append([list_1[i][0], list_1[i][1],
-                           list_2[i][0], list_2[i][1],
-                           list_3[i][0], list_3[i][1],
-                           list_4[i][0], list_4[i][1]])
-    return append_list
+    basis = np.stack([list_1, list_2, list_3, list_4], axis=1).astype(np.float32)
+    return stack_legs(basis, (0, 1, 2, 3))
+
+
+def stack_legs(basis, layout):
+    """
+    Gather the four legs of one movement from a basis of leg trajectories.
+
+    Args:
+        basis: (n x k x 2) array holding k single-leg trajectories
+        layout: Four basis indices in FL, FR, BL, BR order
+
+    Returns:
+        Contiguous (n x 8) array in the order expected by q8_espnow.move_all
+    """
+    return basis[:, list(layout), :].reshape(len(basis), 8)
+
+
+def phase_shift(traj, shift):
+    """
+    Phase-shift a trajectory so that it starts `shift` samples later in the cycle.
+
+    Args:
+        traj: Trajectory array with samples along the first axis
+        shift: int, number of samples to advance
+
+    Returns:
+        Shifted copy of traj
+    """
+    return np.roll(traj, -shift, axis=0)
 
 
 def generate_trot_trajectories(leg, gait_params):
@@ -45,92 +69,73 @@ def generate_trot_trajectories(leg, gait_params):
         gait_params: [stacktype, x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
 
     Returns:
-        Dictionary mapping movement types to trajectory arrays:
+        Dictionary mapping movement types to (n x 8) float32 trajectory arrays:
         {
-            'f': forward (n x 8),
-            'b': backward (n x 8),
-            'l': left turn (n x 8),
-            'r': right turn (n x 8),
-            'fl_0.75': forward-left 75% turn (n x 8),
-            'fl_0.5': forward-left 50% turn (n x 8),
-            'fr_0.75': forward-right 75% turn (n x 8),
-            'fr_0.5': forward-right 50% turn (n x 8),
-            'bl_0.75': backward-left 75% turn (n x 8),
-            'bl_0.5': backward-left 50% turn (n x 8),
-            'br_0.75': backward-right 75% turn (n x 8),
-            'br_0.5': backward-right 50% turn (n x 8)
+            'f': forward,
+            'b': backward,
+            'l': left turn,
+            'r': right turn,
+            'fl_0.75': forward-left 75% turn,
+            'fl_0.5': forward-left 50% turn,
+            'fr_0.75': forward-right 75% turn,
+            'fr_0.5': forward-right 50% turn,
+            'bl_0.75': backward-left 75% turn,
+            'bl_0.5': backward-left 50% turn,
+            'br_0.75': backward-right 75% turn,
+            'br_0.5': backward-right 50% turn
         }
         where n = s1_count + s2_count (complete cycle)
     """
     stacktype, x0, y0, xrange, yrange, yrange2, s1_count, s2_count = gait_params
 
-    # Generate base single-leg trajectories with different stride scales
-    move_full_forward = _generate_base_trajectories(
-        leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, stride_scale=1.0
-    )
-    move_0_75_forward = _generate_base_trajectories(
-        leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, stride_scale=0.75
-    )
-    move_0_5_forward = _generate_base_trajectories(
-        leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, stride_scale=0.5
-    )
-    move_full_backward = _generate_base_trajectories(
-        leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, stride_scale=-1.0
-    )
-    move_0_75_backward = _generate_base_trajectories(
-        leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, stride_scale=-0.75
-    )
-    move_0_5_backward = _generate_base_trajectories(
-        leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, stride_scale=-0.5
+    # Generate base single-leg trajectories with different stride scales in one pass
+    # Basis order: forward 1.0/0.75/0.5, then backward 1.0/0.75/0.5
+    moves = generate_stride_set(
+        leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count,
+        (1.0, 0.75, 0.5, -1.0, -0.75, -0.5)
     )
 
     # Check for failures
-    if any(m is None for m in [move_full_forward, move_0_75_forward, move_0_5_forward,
-                                 move_full_backward, move_0_75_backward, move_0_5_backward]):
+    if any(m is None for m in moves):
         return None
+    moves = np.stack(moves, axis=1).astype(np.float32)
 
     # Phase shift for diagonal gait pattern (trot uses 50% offset)
     len_factor = (s1_count + s2_count) / s1_count
-    phase_shift = int(s1_count * len_factor / 2)
+    shift = int(s1_count * len_factor / 2)
 
-    # Create phase-shifted versions for diagonal leg coordination
-    def phase_shift_trajectory(traj):
-        return traj[phase_shift:] + traj[:phase_shift]
-
-    # Phase-shifted trajectories
-    p_full = phase_shift_trajectory(move_full_forward)
-    p_0_75 = phase_shift_trajectory(move_0_75_forward)
-    p_0_5 = phase_shift_trajectory(move_0_5_forward)
-    n_full = phase_shift_trajectory(move_full_backward)
-    n_0_75 = phase_shift_trajectory(move_0_75_backward)
-    n_0_5 = phase_shift_trajectory(move_0_5_backward)
+    # Basis indices 0-5 are the unshifted trajectories and 6-11 the
+    # phase-shifted versions for diagonal leg coordination
+    basis = np.concatenate((moves, phase_shift(moves, shift)), axis=1)
+    f_full, f_0_75, f_0_5, b_full, b_0_75, b_0_5 = range(6)
+    p_full, p_0_75, p_0_5, n_full, n_0_75, n_0_5 = range(6, 12)
 
     # Generate complete trajectory set for all 12 movement types
     # Robot leg layout:
     #       Front
     #   FL        FR
     #   BL        BR
-    trajectories = {
+    layouts = {
         # Straight movements
-        'f': append_pos_list(move_full_forward, p_full, p_full, move_full_forward),
-        'b': append_pos_list(move_full_backward, n_full, n_full, move_full_backward),
-        'l': append_pos_list(move_full_backward, p_full, n_full, move_full_forward),
-        'r': append_pos_list(move_full_forward, n_full, p_full, move_full_backward),
+        'f': (f_full, p_full, p_full, f_full),
+        'b': (b_full, n_full, n_full, b_full),
+        'l': (b_full, p_full, n_full, f_full),
+        'r': (f_full, n_full, p_full, b_full),
 
         # Forward turns (inside leg has reduced stride)
-        'fl_0.75': append_pos_list(move_0_75_forward, p_full, p_0_75, move_full_forward),
-        'fl_0.5':  append_pos_list(move_0_5_forward, p_full, p_0_5, move_full_forward),
-        'fr_0.75': append_pos_list(move_full_forward, p_0_75, p_full, move_0_75_forward),
-        'fr_0.5':  append_pos_list(move_full_forward, p_0_5, p_full, move_0_5_forward),
+        'fl_0.75': (f_0_75, p_full, p_0_75, f_full),
+        'fl_0.5':  (f_0_5, p_full, p_0_5, f_full),
+        'fr_0.75': (f_full, p_0_75, p_full, f_0_75),
+        'fr_0.5':  (f_full, p_0_5, p_full, f_0_5),
 
         # Backward turns (inside leg has reduced stride)
-        'bl_0.75': append_pos_list(move_0_75_backward, n_full, n_0_75, move_full_backward),
-        'bl_0.5':  append_pos_list(move_0_5_backward, n_full, n_0_5, move_full_backward),
-        'br_0.75': append_pos_list(move_full_backward, n_0_75, n_full, move_0_75_backward),
-        'br_0.5':  append_pos_list(move_full_backward, n_0_5, n_full, move_0_5_backward),
+        'bl_0.75': (b_0_75, n_full, n_0_75, b_full),
+        'bl_0.5':  (b_0_5, n_full, n_0_5, b_full),
+        'br_0.75': (b_full, n_0_75, n_full, b_0_75),
+        'br_0.5':  (b_full, n_0_5, n_full, b_0_5),
     }
 
-    return trajectories
+    return {name: stack_legs(basis, layout) for name, layout in layouts.items()}
 
 
 def generate_walk_trajectories(leg, gait_params):
@@ -143,12 +148,12 @@ def generate_walk_trajectories(leg, gait_params):
         gait_params: [stacktype, x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
 
     Returns:
-        Dictionary mapping movement types to trajectory arrays:
+        Dictionary mapping movement types to (n x 8) float32 trajectory arrays:
         {
-            'f': forward (n x 8),
-            'b': backward (n x 8),
-            'l': left turn (n x 8),
-            'r': right turn (n x 8)
+            'f': forward,
+            'b': backward,
+            'l': left turn,
+            'r': right turn
         }
         where n = s1_count + s2_count (complete cycle)
     """
@@ -170,28 +175,23 @@ def generate_walk_trajectories(leg, gait_params):
     phase_shift_25 = int(s1_count * len_factor / 4)
 
     # Create phase-shifted versions (4 phases for 4 legs)
-    p1 = move_forward
-    p2 = move_forward[phase_shift_25:] + move_forward[:phase_shift_25]
-    p3 = move_forward[phase_shift_25*2:] + move_forward[:phase_shift_25*2]
-    p4 = move_forward[phase_shift_25*3:] + move_forward[:phase_shift_25*3]
-
-    n1 = move_backward
-    n2 = move_backward[phase_shift_25:] + move_backward[:phase_shift_25]
-    n3 = move_backward[phase_shift_25*2:] + move_backward[:phase_shift_25*2]
-    n4 = move_backward[phase_shift_25*3:] + move_backward[:phase_shift_25*3]
+    # Basis indices: p1-p4 forward, n1-n4 backward
+    moves = np.stack([move_forward, move_backward], axis=1).astype(np.float32)
+    basis = np.concatenate([phase_shift(moves, phase_shift_25 * i) for i in range(4)], axis=1)
+    p1, n1, p2, n2, p3, n3, p4, n4 = range(8)
 
     # Robot leg layout:
     #       Front
     #   FL        FR
     #   BL        BR
-    trajectories = {
-        'f': append_pos_list(p1, p2, p3, p4),      # Forward
-        'b': append_pos_list(n1, n2, n3, n4),      # Backward
-        'l': append_pos_list(n1, p2, n3, p4),      # Left turn
-        'r': append_pos_list(p1, n2, p3, n4),      # Right turn
+    layouts = {
+        'f': (p1, p2, p3, p4),      # Forward
+        'b': (n1, n2, n3, n4),      # Backward
+        'l': (n1, p2, n3, p4),      # Left turn
+        'r': (p1, n2, p3, n4),      # Right turn
     }
 
-    return trajectories
+    return {name: stack_legs(basis, layout) for name, layout in layouts.items()}
 
 
 def generate_bound_trajectories(leg, gait_params):
@@ -204,10 +204,10 @@ def generate_bound_trajectories(leg, gait_params):
         gait_params: [stacktype, x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
 
     Returns:
-        Dictionary mapping movement types to trajectory arrays:
+        Dictionary mapping movement types to (n x 8) float32 trajectory arrays:
         {
-            'f': forward (n x 8),
-            'b': backward (n x 8)
+            'f': forward,
+            'b': backward
         }
         where n = s1_count + s2_count (complete cycle)
     """
@@ -226,19 +226,20 @@ def generate_bound_trajectories(leg, gait_params):
 
     # Phase shift for bound (front/back pairs offset)
     split = int((s2_count + s1_count) / 4)
-    p2 = move_forward[split:] + move_forward[:split]
-    n2 = move_backward[split:] + move_backward[:split]
+    moves = np.stack([move_forward, move_backward], axis=1).astype(np.float32)
+    basis = np.concatenate((moves, phase_shift(moves, split)), axis=1)
+    f, b, p2, n2 = range(4)
 
     # Robot leg layout (pairs move together):
     #       Front
     #   FL        FR  (same phase)
     #   BL        BR  (offset phase)
-    trajectories = {
-        'f': append_pos_list(move_forward, move_forward, p2, p2),  # Forward
-        'b': append_pos_list(move_backward, move_backward, n2, n2), # Backward
+    layouts = {
+        'f': (f, f, p2, p2),  # Forward
+        'b': (b, b, n2, n2),  # Backward
     }
 
-    return trajectories
+    return {name: stack_legs(basis, layout) for name, layout in layouts.items()}
 
 
 def generate_pronk_trajectories(leg, gait_params):
@@ -251,10 +252,10 @@ def generate_pronk_trajectories(leg, gait_params):
         gait_params: [stacktype, x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
 
     Returns:
-        Dictionary mapping movement types to trajectory arrays:
+        Dictionary mapping movement types to (n x 8) float32 trajectory arrays:
         {
-            'f': forward (n x 8),
-            'b': backward (n x 8)
+            'f': forward,
+            'b': backward
         }
         where n = s1_count + s2_count (complete cycle)
     """
@@ -272,12 +273,125 @@ def generate_pronk_trajectories(leg, gait_params):
         return None
 
     # All legs move together (no phase shift)
-    trajectories = {
-        'f': append_pos_list(move_forward, move_forward, move_forward, move_forward),  # Forward
-        'b': append_pos_list(move_backward, move_backward, move_backward, move_backward), # Backward
+    basis = np.stack([move_forward, move_backward], axis=1).astype(np.float32)
+    layouts = {
+        'f': (0, 0, 0, 0),  # Forward
+        'b': (1, 1, 1, 1),  # Backward
+    }
+
+    return {name: stack_legs(basis, layout) for name, layout in layouts.items()}
+
+
+def leg_phase_offsets(gait_params):
+    """
+    Get the phase offset of each leg, in samples, used by a gait's stacking.
+
+    Args:
+        gait_params: [stacktype, x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
+
+    Returns:
+        Tuple of four offsets in FL, FR, BL, BR order, or None for an unknown stacktype
+    """
+    stacktype, x0, y0, xrange, yrange, yrange2, s1_count, s2_count = gait_params
+    len_factor = (s1_count + s2_count) / s1_count
+
+    if stacktype == 'trot':
+        shift = int(s1_count * len_factor / 2)
+        return (0, shift, shift, 0)
+    elif stacktype == 'walk':
+        shift = int(s1_count * len_factor / 4)
+        return (0, shift, shift * 2, shift * 3)
+    elif stacktype == 'bound':
+        split = int((s2_count + s1_count) / 4)
+        return (0, 0, split, split)
+    elif stacktype == 'pronk':
+        return (0, 0, 0, 0)
+    return None
+
+
+def generate_stride_basis(leg, gait_params, node_count=9):
+    """
+    Generate a compact basis for continuous per-leg stride control.
+
+    Instead of one (n x 8) table per direction and turn level, this keeps a
+    single-leg trajectory at evenly spaced stride scales from -1.0 to 1.0.
+    Any per-leg stride scale is then produced by interpolating between the
+    two nearest scales in joint space (see GaitManager.start_analog).
+
+    Args:
+        leg: Kinematics solver instance
+        gait_params: [stacktype, x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
+        node_count: Number of stride scales sampled between -1.0 and 1.0
+
+    Returns:
+        Dictionary or None on failure:
+        {
+            'scales': (S,) stride scales of the basis nodes,
+            'basis': (n x S x 2) float32 single-leg joint trajectories,
+            'offsets': (4,) per-leg phase offsets in FL, FR, BL, BR order
+        }
+    """
+    stacktype, x0, y0, xrange, yrange, yrange2, s1_count, s2_count = gait_params
+    offsets = leg_phase_offsets(gait_params)
+    if offsets is None:
+        return None
+
+    scales = np.linspace(-1.0, 1.0, node_count)
+    moves = generate_stride_set(
+        leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, scales
+    )
+    if any(m is None for m in moves):
+        return None
+
+    return {
+        'scales': scales,
+        'basis': np.stack(moves, axis=1).astype(np.float32),
+        'offsets': np.array(offsets),
     }
 
-    return trajectories
+
+def generate_stride_set(leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, stride_scales, workers=None):
+    """
+    Generate base single-leg trajectories for several stride scales at once.
+
+    All scales are solved in one batched IK pass over a
+    (stride scale x range reduction x phase) grid. For gaits that ask for many
+    scales, the scales can also be split across a process pool. The caller
+    must then be import-safe for spawned processes (guarded by
+    `if __name__ == '__main__'`).
+
+    Args:
+        leg: Kinematics solver instance
+        x0, y0: Starting position
+        xrange, yrange, yrange2: Range parameters
+        s1_count: Lift phase step count
+        s2_count: Down phase step count
+        stride_scales: Sequence of stride length multipliers (negative = backward)
+        workers: Optional number of worker processes (None = single batched pass)
+
+    Returns:
+        List aligned with stride_scales of (n x 2) [q1, q2] arrays, None where a scale fails
+    """
+    stride_scales = list(stride_scales)
+    if workers and workers > 1 and len(stride_scales) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        chunks = [stride_scales[i::workers] for i in range(workers)]
+        chunks = [chunk for chunk in chunks if chunk]
+        args = [(leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, chunk)
+                for chunk in chunks]
+        with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+            results = list(pool.map(_solve_stride_chunk, args))
+        # Undo the round-robin split
+        cycles = [None] * len(stride_scales)
+        for i, chunk_result in enumerate(results):
+            cycles[i::len(chunks)] = chunk_result
+    else:
+        cycles = _solve_feasible_cycles(
+            leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, stride_scales
+        )
+
+    return [None if cycle is None else np.column_stack((cycle[2], cycle[3]))
+            for cycle in cycles]
 
 
 def _generate_base_trajectories(leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, stride_scale=1.0):
@@ -295,44 +409,68 @@ def _generate_base_trajectories(leg, x0, y0, xrange, yrange, yrange2, s1_count,
                      1.0 = full stride, 0.75 = 75% stride, 0.5 = 50% stride
 
     Returns:
-        List of [q1, q2] joint angles or None on failure
+        (n x 2) array of [q1, q2] joint angles or None on failure
     """
-    move_trajectory = []
-    x_start = x0 - (xrange * stride_scale) / 2
-    x_end = x0 + (xrange * stride_scale) / 2
-    x_lift_step = (xrange * stride_scale) / s1_count
-    x_down_step = (xrange * stride_scale) / s2_count
-    x = x_start
+    return generate_stride_set(
+        leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, [stride_scale]
+    )[0]
 
+
+def _solve_stride_chunk(args):
+    """Process pool entry point for generate_stride_set."""
+    return _solve_feasible_cycles(*args)
+
+
+def _solve_feasible_cycles(leg, x0, y0, xrange, yrange, yrange2, s1_count, s2_count, stride_scales):
+    """
+    Solve one gait cycle per stride scale at the largest reachable
+    (xrange - k, yrange - k) level. All levels are checked against the
+    workspace map in one pass, and IK is solved for the chosen levels only.
+
+    Returns:
+        List aligned with stride_scales of (xrange, yrange, q1, q2) tuples for
+        the first fully reachable level, None where no level is reachable
+    """
     # Check physical limits
     if y0 - yrange < 5:
-        return None
-
-    # Generate trajectory points for complete gait cycle
-    for i in range(s1_count + s2_count):
-        if i < s1_count:
-            # Lift phase: sinusoidal lift trajectory
-            x += x_lift_step
-            freq = math.pi / s1_count
-            y = y0 - math.sin((i + 1) * freq) * yrange
-        else:
-            # Down phase: sinusoidal down trajectory
-            x = x - x_down_step
-            freq = math.pi / s2_count
-            y = y0 + math.sin((i - s1_count + 1) * freq) * yrange2
-
-        # Solve inverse kinematics
-        q1, q2, check = leg.ik_solve(x, y, True, 1)
-
-        # Validate IK solution
-        if len(str(q1)) > 5 or len(str(q2)) > 5:
-            xr_new, yr_new = xrange - 1, yrange - 1
-            if xr_new > 0 and yr_new > 0:
-                return _generate_base_trajectories(
-                    leg, x0, y0, xr_new, yr_new, yrange2, s1_count, s2_count, stride_scale
-                )
-            return None
-
-        move_trajectory.append([q1, q2])
-
-    return move_trajectory
+        return [None] * len(stride_scales)
+
+    # Candidate reductions: the requested ranges, then 1 mm smaller each time
+    # while both ranges stay positive.
+    shrink = [0]
+    while xrange - (shrink[-1] + 1) > 0 and yrange - (shrink[-1] + 1) > 0:
+        shrink.append(shrink[-1] + 1)
+    shrink = np.array(shrink)
+    xr = (xrange - shrink)[:, None]
+    yr = (yrange - shrink)[:, None]
+    # Grid axes: (stride scale, reduction level, phase sample)
+    stride = xr * np.asarray(stride_scales, dtype=float)[:, None, None]
+    grid_shape = (len(stride_scales), len(shrink))
+
+    # Generate trajectory points for complete gait cycle. x is accumulated
+    # step by step (cumsum) so the samples match the original running sum.
+    x_steps = np.concatenate((x0 - stride / 2,
+                              np.repeat(stride / s1_count, s1_count, axis=2),
+                              np.repeat(-stride / s2_count, s2_count, axis=2)),
+                             axis=2)
+    xs = np.cumsum(x_steps, axis=2)[:, :, 1:]
+    # Lift phase: sinusoidal lift trajectory
+    lift = y0 - np.sin(np.arange(1, s1_count + 1) * (math.pi / s1_count)) * yr
+    # Down phase: sinusoidal down trajectory
+    down = y0 + np.sin(np.arange(1, s2_count + 1) * (math.pi / s2_count)) * yrange2
+    ys = np.concatenate((np.broadcast_to(lift, grid_shape + (s1_count,)),
+                         np.broadcast_to(down, grid_shape + (s2_count,))), axis=2)
+
+    # Check reachability of every candidate at once, then solve inverse
+    # kinematics only for the first fully reachable level of each scale
+    feasible = leg.ik_check_batch(xs, ys).all(axis=2)
+    found = feasible.any(axis=1)
+    level = feasible.argmax(axis=1)
+    rows = np.flatnonzero(found)
+    q1, q2, _ = leg.ik_solve_batch(xs[rows, level[rows]], ys[rows, level[rows]], True, 1)
+
+    cycles = [None] * len(stride_scales)
+    for n, i in enumerate(rows):
+        k = level[i]
+        cycles[i] = (xrange - shrink[k], yrange - shrink[k], q1[n], q2[n])
+    return cycles
@@ -6,7 +6,13 @@ This module manages gait trajectories, movement state, and direction switching
 for cyclic locomotion patterns.
 '''
 
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+from helpers import Q8Logger
 from gait_generator import (
+    generate_stride_basis,
     generate_trot_trajectories,
     generate_walk_trajectories,
     generate_bound_trajectories,
@@ -32,7 +38,7 @@ class GaitManager:
     Manages gait trajectories, movement state, and direction switching.
 
     This class encapsulates all state related to cyclic locomotion:
-    - Pre-calculated trajectory storage
+    - Pre-calculated trajectory storage (in-memory LRU, optional disk cache)
     - Phase tracking across direction changes
     - Fallback logic for limited movement types
     - Movement state management
@@ -54,26 +60,62 @@ class GaitManager:
         'br': ['b'],
     }
 
-    def __init__(self, leg, available_gaits=None):
+    def __init__(self, leg, available_gaits=None, cache_size=4, disk_cache=None, blend_ticks=10,
+                 shared_store=None):
         """
         Initialize the GaitManager.
 
         Args:
             leg: Kinematics solver instance
             available_gaits: Optional dict of gait definitions (defaults to GAITS)
+            cache_size: Number of gaits whose trajectories are kept in memory
+            disk_cache: Optional TrajectoryCache for persisting trajectories across launches
+            blend_ticks: Number of ticks used to cross-fade between trajectories on a switch
+            shared_store: Optional GaitManager (same leg geometry) whose trajectory storage
+                          is shared, so several robots hold each gait in memory only once.
+                          A gait that any of the sharing managers has loaded is never evicted.
         """
         self.leg = leg
         self.available_gaits = available_gaits if available_gaits else GAITS
-        self.current_trajectories = {}
+        self.cache_size = max(1, cache_size)
+        self.disk_cache = disk_cache
+        self.current_trajectories = OrderedDict()  # LRU of gait name -> trajectories
+        self.gait_status = {}  # gait name -> 'loading', 'ready' or 'failed' (guarded by _lock)
+        self._loading = {}  # gait name (or ('basis', name)) -> Event set when its calculation finishes
+        self.prefetch_thread = None
+        self._lock = threading.Lock()
         self.current_gait = None
         self.current_direction = None
         self.phase_index = 0
         self.ongoing = False
         self.current_trajectory = None
+        self.stride_bases = {}  # gait name -> basis from generate_stride_basis (None = failed)
+        self.analog_basis = None
+        self.leg_scales = None
+        self.blend_ticks = blend_ticks
+        self.blend_rows = None
+        self.blend_index = 0
+        self.last_row = None  # Last row returned by tick()
+        self._sharing = weakref.WeakSet([self])  # Managers sharing this trajectory storage
+
+        if shared_store is not None:
+            self.current_trajectories = shared_store.current_trajectories
+            self.gait_status = shared_store.gait_status
+            self._loading = shared_store._loading
+            self._lock = shared_store._lock
+            self.stride_bases = shared_store.stride_bases
+            self._sharing = shared_store._sharing
+            with self._lock:
+                self._sharing.add(self)
 
     def load_gait(self, gait_name):
         """
-        Pre-calculate and load trajectories for a given gait.
+        Load trajectories for a given gait, calculating them only when needed.
+
+        Lookup order is the in-memory LRU cache, then the on-disk cache, then
+        trajectory generation (whose result is written back to disk). A gait
+        that is already being fetched (e.g. by prefetch_all) is waited for
+        rather than generated twice, and a gait that failed returns at once.
 
         Args:
             gait_name: Name of the gait (e.g., 'TROT', 'WALK')
@@ -84,27 +126,123 @@ class GaitManager:
         if gait_name not in self.available_gaits:
             return False
 
-        gait_params = self.available_gaits[gait_name]
+        with self._lock:
+            if gait_name in self.current_trajectories:
+                # Already calculated: switching is just a pointer swap
+                self.current_trajectories.move_to_end(gait_name)
+                self.current_gait = gait_name
+                return True
+            if self.gait_status.get(gait_name) == 'failed':
+                return False
+            done, owner = self._claim_fetch(gait_name)
+
+        if owner:
+            self._fetch_and_store(gait_name, done)
+        else:
+            done.wait()
+
+        with self._lock:
+            if gait_name not in self.current_trajectories:
+                return False
+            self.current_trajectories.move_to_end(gait_name)
+            self.current_gait = gait_name
+        return True
+
+    def prefetch_all(self, gait_names=None, on_ready=None, stride_bases=False):
+        """
+        Calculate trajectories for every gait in a background thread.
+
+        Gaits become available to load_gait one at a time as they finish, so
+        later switches do not block the control loop. At most cache_size gaits
+        are kept in memory, so only the first cache_size gaits are prefetched.
+
+        Args:
+            gait_names: Optional list of gaits to prefetch (defaults to all available gaits)
+            on_ready: Optional callback(gait_name, success) run in the worker thread
+            stride_bases: Also calculate each gait's stride basis for start_analog
+
+        Returns:
+            threading.Thread: The started worker thread
+        """
+        if gait_names is None:
+            gait_names = list(self.available_gaits.keys())
+        if len(gait_names) > self.cache_size:
+            Q8Logger.warning(f"Gait cache holds {self.cache_size} gaits, not prefetching: "
+                             f"{', '.join(gait_names[self.cache_size:])}")
+            gait_names = gait_names[:self.cache_size]
+
+        # Claim every gait up front so load_gait waits for the worker instead
+        # of generating the same gait again
+        claims = []
+        with self._lock:
+            for gait_name in gait_names:
+                if gait_name not in self.current_trajectories:
+                    claims.append((gait_name,) + self._claim_fetch(gait_name))
+
+        def worker():
+            for gait_name, done, owner in claims:
+                if owner:
+                    self._fetch_and_store(gait_name, done)
+                else:
+                    done.wait()
+                if stride_bases and self._claim_stride_basis(gait_name):
+                    self._build_stride_basis(gait_name)
+                if on_ready:
+                    on_ready(gait_name, self.is_ready(gait_name))
+
+        self.prefetch_thread = threading.Thread(target=worker, name='GaitPrefetch', daemon=True)
+        self.prefetch_thread.start()
+        return self.prefetch_thread
+
+    def is_ready(self, gait_name):
+        """Check if a gait's trajectories are in memory and can be loaded instantly."""
+        return gait_name in self.current_trajectories
+
+    def get_gait_status(self, gait_name, stride_basis=False):
+        """
+        Get the loading state of a gait.
+
+        Args:
+            gait_name: Name of the gait
+            stride_basis: Report on the gait's stride basis (for start_analog)
+                          instead of its trajectories
+
+        Returns:
+            str: 'ready', 'loading', 'failed', or None if never requested
+        """
+        with self._lock:
+            if stride_basis:
+                if ('basis', gait_name) in self._loading:
+                    return 'loading'
+                if gait_name not in self.stride_bases:
+                    return None
+                return 'failed' if self.stride_bases[gait_name] is None else 'ready'
+            if gait_name in self.current_trajectories:
+                return 'ready'
+            return self.gait_status.get(gait_name)
+
+    def generate_trajectories(self, gait_params):
+        """
+        Calculate the full trajectory set for a gait definition.
+
+        Args:
+            gait_params: [STACKTYPE, x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
+
+        Returns:
+            dict: Direction name to trajectory array, or None on failure
+        """
         stacktype = gait_params[0]
 
         # Route to appropriate generator based on stacktype
         if stacktype == 'trot':
-            trajectories = generate_trot_trajectories(self.leg, gait_params)
+            return generate_trot_trajectories(self.leg, gait_params)
         elif stacktype == 'walk':
-            trajectories = generate_walk_trajectories(self.leg, gait_params)
+            return generate_walk_trajectories(self.leg, gait_params)
         elif stacktype == 'bound':
-            trajectories = generate_bound_trajectories(self.leg, gait_params)
+            return generate_bound_trajectories(self.leg, gait_params)
         elif stacktype == 'pronk':
-            trajectories = generate_pronk_trajectories(self.leg, gait_params)
-        else:
-            return False
-
-        if trajectories is None:
-            return False
-
-        self.current_trajectories = {gait_name: trajectories}
-        self.current_gait = gait_name
-        return True
+            return generate_pronk_trajectories(self.leg, gait_params)
+        return None
 
     def start_movement(self, direction):
         """
@@ -123,7 +261,7 @@ class GaitManager:
 
         # Try exact match first
         if direction in gait_trajectories:
-            self.current_trajectory = gait_trajectories[direction]
+            self._switch_trajectory(gait_trajectories[direction])
             self.current_direction = direction
             self.ongoing = True
             return True
@@ -132,7 +270,7 @@ class GaitManager:
         if direction in self.FALLBACK_MAP:
             for fallback in self.FALLBACK_MAP[direction]:
                 if fallback in gait_trajectories:
-                    self.current_trajectory = gait_trajectories[fallback]
+                    self._switch_trajectory(gait_trajectories[fallback])
                     self.current_direction = direction  # Remember requested direction
                     self.ongoing = True
                     return True
@@ -140,23 +278,73 @@ class GaitManager:
         # No suitable trajectory found
         return False
 
+    def start_analog(self, leg_scales):
+        """
+        Start or update movement with a continuous stride scale per leg.
+
+        Joint commands are synthesized on every tick from the gait's stride
+        basis. The basis is calculated by prefetch_all(stride_bases=True), or
+        else in a background thread the first time it is needed; until it is
+        ready this returns False and the caller can use start_movement instead.
+
+        Args:
+            leg_scales: Four stride scales in FL, FR, BL, BR order, each in [-1.0, 1.0]
+                        (negative = backward)
+
+        Returns:
+            bool: True if movement started, False if no basis is available
+        """
+        if self.current_gait not in self.available_gaits:
+            return False
+
+        gait_name = self.current_gait
+        if self._claim_stride_basis(gait_name):
+            threading.Thread(target=self._build_stride_basis, args=(gait_name,),
+                             name='StrideBasis', daemon=True).start()
+        basis = self.stride_bases.get(gait_name)
+        if basis is None:
+            return False  # Still being calculated, or the gait has no basis
+
+        self._remap_phase(len(basis['basis']))
+        self.blend_rows = None
+        self.analog_basis = basis
+        self.leg_scales = np.clip(np.asarray(leg_scales, dtype=float), -1.0, 1.0)
+        self.current_trajectory = None
+        self.current_direction = 'analog'
+        self.ongoing = True
+        return True
+
     def tick(self):
         """
         Get the next position in the current trajectory.
 
         Returns:
-            list: Joint positions for all motors, or None if no movement active
+            Row of 8 joint positions (float32 array), or None if no movement active
         """
-        if not self.ongoing or self.current_trajectory is None:
+        if not self.ongoing:
+            return None
+
+        if self.analog_basis is not None:
+            self.last_row = self._synthesize_analog()
+            return self.last_row
+
+        if self.current_trajectory is None:
             return None
 
-        # Get current position using phase index
+        # Get current position using phase index, or the cross-fade after a switch
         current_index = self.phase_index % len(self.current_trajectory)
-        pos = self.current_trajectory[current_index]
+        if self.blend_rows is not None:
+            pos = self.blend_rows[self.blend_index]
+            self.blend_index += 1
+            if self.blend_index >= len(self.blend_rows):
+                self.blend_rows = None
+        else:
+            pos = self.current_trajectory[current_index]
 
         # Increment phase for next tick
         self.phase_index = (self.phase_index + 1) % len(self.current_trajectory)
 
+        self.last_row = pos
         return pos
 
     def stop(self):
@@ -164,6 +352,10 @@ class GaitManager:
         self.ongoing = False
         self.current_direction = None
         self.current_trajectory = None
+        self.analog_basis = None
+        self.leg_scales = None
+        self.blend_rows = None
+        self.last_row = None
         self.phase_index = 0
 
     def is_moving(self):
@@ -177,3 +369,165 @@ class GaitManager:
     def get_phase(self):
         """Get the current phase index."""
         return self.phase_index
+
+    def get_phase_fraction(self):
+        """Get the current phase as a fraction of the gait cycle in [0, 1)."""
+        length = self._cycle_length()
+        return self.phase_index / length if length else 0.0
+
+    def _claim_fetch(self, gait_name):
+        """
+        Register a fetch of gait_name, or join the one already in flight.
+        Caller must hold self._lock.
+
+        Returns:
+            tuple: (threading.Event set when the fetch finishes, True if the caller must fetch)
+        """
+        done = self._loading.get(gait_name)
+        if done is not None:
+            return done, False
+        done = threading.Event()
+        self._loading[gait_name] = done
+        self.gait_status[gait_name] = 'loading'
+        return done, True
+
+    def _fetch_and_store(self, gait_name, done):
+        """Fetch a claimed gait, store the result and wake anyone waiting on it."""
+        trajectories = None
+        try:
+            trajectories = self._fetch_trajectories(gait_name)
+        finally:
+            with self._lock:
+                if trajectories is not None:
+                    self._store_trajectories(gait_name, trajectories)
+                else:
+                    self.gait_status[gait_name] = 'failed'
+                del self._loading[gait_name]
+            done.set()
+
+    def _claim_stride_basis(self, gait_name):
+        """
+        Register a stride basis calculation unless the basis exists or is in flight.
+
+        Returns:
+            bool: True if the caller must call _build_stride_basis(gait_name)
+        """
+        key = ('basis', gait_name)
+        with self._lock:
+            if gait_name in self.stride_bases or key in self._loading:
+                return False
+            self._loading[key] = threading.Event()
+            return True
+
+    def _build_stride_basis(self, gait_name):
+        """Calculate a claimed stride basis. A failure is stored as None so it is not retried."""
+        basis = None
+        try:
+            basis = generate_stride_basis(self.leg, self.available_gaits[gait_name])
+        finally:
+            with self._lock:
+                self.stride_bases[gait_name] = basis
+                done = self._loading.pop(('basis', gait_name))
+            done.set()
+
+    def _fetch_trajectories(self, gait_name):
+        """
+        Get trajectories from the on-disk cache or by generating them.
+        Does not touch shared state, so it is safe to call from a worker thread.
+        """
+        gait_params = self.available_gaits[gait_name]
+        trajectories = None
+        if self.disk_cache is not None:
+            trajectories = self.disk_cache.load(self.leg, gait_params)
+
+        if trajectories is None:
+            trajectories = self.generate_trajectories(gait_params)
+            if trajectories is None:
+                return None
+            if self.disk_cache is not None:
+                self.disk_cache.save(self.leg, gait_params, trajectories)
+        return trajectories
+
+    def _store_trajectories(self, gait_name, trajectories):
+        """Insert trajectories into the LRU cache. Caller must hold self._lock."""
+        self.current_trajectories[gait_name] = trajectories
+        self.current_trajectories.move_to_end(gait_name)
+        self.gait_status[gait_name] = 'ready'
+        # Gaits loaded by any manager sharing the storage stay cached
+        active = {manager.current_gait for manager in self._sharing}
+        for name in list(self.current_trajectories.keys()):
+            if len(self.current_trajectories) <= self.cache_size:
+                break
+            if name not in active and name != gait_name:
+                del self.current_trajectories[name]
+                self.gait_status.pop(name, None)
+
+    def _synthesize_analog(self):
+        """Interpolate the stride basis at each leg's scale for the current phase."""
+        scales = self.analog_basis['scales']
+        basis = self.analog_basis['basis']
+        n = len(basis)
+
+        # Sample index of each leg, then the two nearest basis nodes and weight
+        index = (self.phase_index + self.analog_basis['offsets']) % n
+        t = (self.leg_scales - scales[0]) / (scales[1] - scales[0])
+        lo = np.clip(np.floor(t).astype(int), 0, len(scales) - 2)
+        w = (t - lo)[:, None]
+        legs = basis[index, lo] * (1 - w) + basis[index, lo + 1] * w
+
+        self.phase_index = (self.phase_index + 1) % n
+        return np.round(legs.reshape(8), 1).astype(np.float32)
+
+    def _cycle_length(self):
+        """Get the number of samples in the active trajectory or stride basis."""
+        if self.analog_basis is not None:
+            return len(self.analog_basis['basis'])
+        if self.current_trajectory is not None:
+            return len(self.current_trajectory)
+        return 0
+
+    def _remap_phase(self, new_length):
+        """Keep the same fraction of the gait cycle when the cycle length changes."""
+        old_length = self._cycle_length()
+        if self.ongoing and old_length and old_length != new_length:
+            fraction = self.phase_index / old_length
+            self.phase_index = int(round(fraction * new_length)) % new_length
+
+    def _switch_trajectory(self, trajectory):
+        """
+        Make trajectory the active one, preserving the cycle phase.
+
+        When switching mid-movement, the next blend_ticks commands are a
+        precomputed joint-space cross-fade from the rows that would have been
+        sent next to the new trajectory, so no single tick jumps by a full step.
+        That old stream continues an unfinished cross-fade, and after analog
+        movement it holds the last synthesized row.
+        """
+        previous = self.current_trajectory
+        if trajectory is previous and self.analog_basis is None:
+            return
+
+        was_ongoing = self.ongoing and self.last_row is not None
+        old_index = self.phase_index
+        steps = np.arange(self.blend_ticks)
+        if not was_ongoing or self.blend_ticks <= 0:
+            old_rows = None
+        elif self.analog_basis is not None or previous is None:
+            old_rows = np.repeat(self.last_row[None, :], self.blend_ticks, axis=0)
+        else:
+            old_rows = previous[(old_index + steps) % len(previous)]
+            if self.blend_rows is not None:
+                pending = self.blend_rows[self.blend_index:self.blend_index + self.blend_ticks]
+                old_rows[:len(pending)] = pending
+        self._remap_phase(len(trajectory))
+        self.analog_basis = None
+
+        if old_rows is not None:
+            new_rows = trajectory[(self.phase_index + steps) % len(trajectory)]
+            w = ((steps + 1) / (self.blend_ticks + 1))[:, None]
+            self.blend_rows = np.round(old_rows * (1 - w) + new_rows * w, 1).astype(np.float32)
+            self.blend_index = 0
+        else:
+            self.blend_rows = None
+
+        self.current_trajectory = trajectory
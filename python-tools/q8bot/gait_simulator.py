@@ -0,0 +1,215 @@
+'''
+Kinematic gait simulator for Q8bot.
+Plays gait trajectories the way GaitManager streams them, one row per control
+tick, and runs forward kinematics on every tick to report foot paths, duty
+factors, joint velocities and accelerations and the peak per-tick joint
+change. Any number of gaits and variants are analyzed together: their cycles
+are concatenated and every quantity is computed in one vectorized pass, so
+thousands of candidate gaits can be screened against servo limits offline.
+
+Run it to print a summary of every gait in GAITS:
+    python gait_simulator.py --velocity-limit 700
+'''
+
+import argparse
+import numpy as np
+from gait_manager import GaitManager, GAITS
+from kinematics_solver import k_solver
+
+# Foot height tolerance in mm when deciding ground contact
+STANCE_TOL = 0.5
+
+
+def contact_height(gait_params, stance_tol=STANCE_TOL):
+    """
+    Get the foot height above which a foot counts as on the ground.
+
+    Lifting gaits (yrange > 0) swing above the nominal height y0 and stand at
+    or below it. Push-off gaits such as BOUND and PRONK swing at y0 and are on
+    the ground only while pushing below it.
+
+    Args:
+        gait_params: [STACKTYPE, x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
+        stance_tol: Height tolerance in mm
+
+    Returns:
+        float: Contact threshold, a foot is in contact when its y >= threshold
+    """
+    y0, yrange = gait_params[2], gait_params[4]
+    return y0 - stance_tol if yrange > 0 else y0 + stance_tol
+
+
+def analyze_trajectories(leg, trajectories, contact_heights, rate_hz=200, limits=None):
+    """
+    Analyze cyclic joint trajectories played at the control rate.
+
+    Every trajectory is one gait cycle of (n x 8) joint rows in deg that
+    loops back to its first row. All cycles are concatenated, so forward
+    kinematics and every derivative run once over all ticks of all gaits.
+    Single-leg cycles work too: any (n x 2k) [q1, q2] layout is treated as k legs.
+
+    Args:
+        leg: Kinematics solver instance
+        trajectories: List of (n x 8) joint trajectories in deg, in FL, FR, BL, BR order
+        contact_heights: Contact threshold per trajectory (see contact_height)
+        rate_hz: Control rate the rows are played at
+        limits: Optional servo limits dict with any of 'velocity' (deg/s),
+                'acceleration' (deg/s^2) and 'delta' (deg per tick)
+
+    Returns:
+        List aligned with trajectories of report dicts (see simulate_gaits)
+    """
+    lengths = np.array([len(traj) for traj in trajectories])
+    if len(lengths) == 0:
+        return []
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    q = np.concatenate([np.asarray(traj, dtype=float) for traj in trajectories])
+
+    # Next and previous tick of every row, wrapping around within its own cycle
+    owner = np.repeat(np.arange(len(lengths)), lengths)
+    local = np.arange(len(q)) - starts[owner]
+    next_index = starts[owner] + (local + 1) % lengths[owner]
+    prev_index = starts[owner] + (local - 1) % lengths[owner]
+
+    # Foot positions of all four legs on every tick: (ticks x 4)
+    x, y, valid = leg.fk_solve_batch(q[:, 0::2], q[:, 1::2], True, None)
+    contact = y >= np.asarray(contact_heights, dtype=float)[owner, None]
+
+    # Distance in mm to the edge of the workspace: each motor reaches a ring
+    # between |l2 - l1| and l1 + l2 around it, with the motors at (d, 0) and (0, 0)
+    c1 = np.hypot(x - leg.d, y)
+    c2 = np.hypot(x, y)
+    margin = np.minimum(np.minimum(leg.l1 + leg.l2 - c1, c1 - abs(leg.l2 - leg.l1)),
+                        np.minimum(leg.l1p + leg.l2p - c2, c2 - abs(leg.l2p - leg.l1p)))
+
+    # Per-tick joint change, velocity and acceleration: (ticks x 8)
+    delta = q[next_index] - q
+    velocity = delta * rate_hz
+    acceleration = (q[next_index] - 2 * q + q[prev_index]) * rate_hz**2
+
+    # Per-cycle reductions
+    peak_delta = np.maximum.reduceat(np.abs(delta), starts)
+    peak_velocity = peak_delta * rate_hz
+    peak_acceleration = np.maximum.reduceat(np.abs(acceleration), starts)
+    duty_factor = np.add.reduceat(contact, starts) / lengths[:, None]
+    fk_valid = np.logical_and.reduceat(valid, starts)
+    x_span = np.fmax.reduceat(x, starts) - np.fmin.reduceat(x, starts)
+    y_low = np.fmin.reduceat(y, starts)
+    y_high = np.fmax.reduceat(y, starts)
+    reach_margin = np.fmin.reduceat(margin, starts)
+
+    reports = []
+    for i, (start, length) in enumerate(zip(starts, lengths)):
+        rows = slice(start, start + length)
+        report = {
+            'ticks': int(length),
+            'cycle_time': length / rate_hz,
+            'foot_paths': np.stack((x[rows], y[rows]), axis=2),
+            'contact': contact[rows],
+            'fk_valid': fk_valid[i],
+            'duty_factor': duty_factor[i],
+            'stride_length': x_span[i],
+            'foot_height_range': (y_low[i], y_high[i]),
+            'reach_margin': reach_margin[i],
+            'joint_velocity': velocity[rows],
+            'joint_acceleration': acceleration[rows],
+            'peak_delta': peak_delta[i],
+            'peak_velocity': peak_velocity[i],
+            'peak_acceleration': peak_acceleration[i],
+        }
+        if limits:
+            report['violations'] = _check_limits(report, limits)
+        reports.append(report)
+    return reports
+
+
+def simulate_gaits(leg, gaits=None, direction='f', rate_hz=200, limits=None,
+                   stance_tol=STANCE_TOL, gait_manager=None):
+    """
+    Play gaits through GaitManager and analyze one cycle of each.
+
+    Args:
+        leg: Kinematics solver instance
+        gaits: Dict of gait definitions in GAITS format (defaults to GAITS)
+        direction: Movement direction to play (e.g., 'f', 'b', 'l', 'fl_0.75')
+        rate_hz: Control rate in Hz (operate.py SPEED)
+        limits: Optional servo limits dict, see analyze_trajectories
+        stance_tol: Height tolerance in mm when deciding ground contact
+        gait_manager: Optional GaitManager to load the trajectories through,
+                      e.g. one with a disk cache
+
+    Returns:
+        dict: Gait name to report dict, None for gaits that failed to generate.
+              Reports hold 'ticks', 'cycle_time' (s), 'foot_paths'
+              (ticks x 4 x 2 foot x, y in mm), 'contact' (ticks x 4),
+              'fk_valid' (4,), per-leg 'duty_factor' and 'stride_length' (mm),
+              'clearance' (mm the foot lifts above y0), 'foot_height_range',
+              'reach_margin' (closest approach to the workspace edge in mm),
+              'joint_velocity' (deg/s) and 'joint_acceleration' (deg/s^2) per
+              tick (ticks x 8), per-joint 'peak_delta' (deg per tick),
+              'peak_velocity' and 'peak_acceleration', and 'violations' when
+              limits are given
+    """
+    gaits = gaits if gaits else GAITS
+    manager = gait_manager or GaitManager(leg, gaits, cache_size=len(gaits))
+
+    names, trajectories, heights = [], [], []
+    for name, gait_params in gaits.items():
+        if not manager.load_gait(name) or not manager.start_movement(direction):
+            continue
+        # The rows GaitManager.tick() plays, one per control tick
+        names.append(name)
+        trajectories.append(manager.current_trajectory)
+        heights.append(contact_height(gait_params, stance_tol))
+        manager.stop()
+
+    reports = dict.fromkeys(gaits)
+    for name, report in zip(names, analyze_trajectories(leg, trajectories, heights, rate_hz, limits)):
+        report['clearance'] = np.maximum(0.0, gaits[name][2] - report['foot_height_range'][0])
+        reports[name] = report
+    return reports
+
+
+#-------------------#
+# Private Functions #
+#-------------------#
+
+def _check_limits(report, limits):
+    """List the limits a report exceeds, as (quantity, joint indices) tuples."""
+    peaks = {'velocity': report['peak_velocity'], 'acceleration': report['peak_acceleration'],
+             'delta': report['peak_delta']}
+    violations = []
+    for quantity, limit in limits.items():
+        joints = np.flatnonzero(peaks[quantity] > limit)
+        if len(joints):
+            violations.append((quantity, joints.tolist()))
+    return violations
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Q8bot kinematic gait analysis')
+    parser.add_argument('--direction', default='f', help='Movement direction to play')
+    parser.add_argument('--rate', type=float, default=200, help='Control rate in Hz')
+    parser.add_argument('--velocity-limit', type=float, help='Servo speed limit in deg/s')
+    parser.add_argument('--acceleration-limit', type=float, help='Servo acceleration limit in deg/s^2')
+    args = parser.parse_args()
+
+    limits = {}
+    if args.velocity_limit:
+        limits['velocity'] = args.velocity_limit
+    if args.acceleration_limit:
+        limits['acceleration'] = args.acceleration_limit
+
+    reports = simulate_gaits(k_solver(), direction=args.direction, rate_hz=args.rate, limits=limits)
+    print(f"{'GAIT':<10} {'CYCLE s':>8} {'DUTY':>5} {'STRIDE':>7} {'CLEAR':>6} "
+          f"{'DEG/TICK':>9} {'DEG/S':>7} {'DEG/S^2':>9}  LIMITS")
+    for name, report in reports.items():
+        if report is None:
+            print(f"{name:<10} failed to generate")
+            continue
+        status = 'ok' if not report.get('violations') else \
+            ', '.join(f"{quantity} {joints}" for quantity, joints in report['violations'])
+        print(f"{name:<10} {report['cycle_time']:>8.3f} {report['duty_factor'].mean():>5.2f} "
+              f"{report['stride_length'].mean():>7.1f} {report['clearance'].mean():>6.1f} "
+              f"{report['peak_delta'].max():>9.2f} {report['peak_velocity'].max():>7.0f} "
+              f"{report['peak_acceleration'].max():>9.0f}  {status}")
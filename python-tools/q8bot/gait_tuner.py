@@ -0,0 +1,262 @@
+'''
+Gait parameter auto-tuner for Q8bot.
+Samples candidate gait definitions (x0, y0, xrange, yrange, yrange2, s1_count,
+s2_count) for one stack type, generates each candidate's stride set exactly as
+the gait generators do, and scores every feasible candidate with the
+vectorized kinematic model in gait_simulator. Candidates are split across a
+process pool, so all cores are used. The Pareto set over stride length, foot
+clearance, reachability margin and peak joint speed is printed as entries
+ready to paste into GAITS.
+
+Example:
+    python gait_tuner.py trot --samples 20000 --max-speed 2500
+'''
+
+import argparse
+import os
+import numpy as np
+from gait_generator import generate_stride_set
+from gait_manager import GAITS
+from gait_simulator import analyze_trajectories, contact_height
+from kinematics_solver import k_solver
+
+# Parameter order after STACKTYPE in a GAITS entry
+PARAM_NAMES = ('x0', 'y0', 'xrange', 'yrange', 'yrange2', 's1_count', 's2_count')
+# x0 and y0 are searched in 0.01 mm steps, everything else in whole units
+PARAM_DECIMALS = (2, 2, 0, 0, 0, 0, 0)
+
+# Search ranges per stack type, as (low, high) or a fixed value
+SEARCH_BOUNDS = {
+    'trot':  {'x0': (0, 19.5), 'y0': (25, 60), 'xrange': (10, 60), 'yrange': (5, 30),
+              'yrange2': 0, 's1_count': (8, 30), 's2_count': (16, 60)},
+    'walk':  {'x0': (0, 19.5), 'y0': (25, 60), 'xrange': (10, 50), 'yrange': (5, 30),
+              'yrange2': 0, 's1_count': (10, 40), 's2_count': (60, 200)},
+    'bound': {'x0': (0, 19.5), 'y0': (25, 50), 'xrange': (10, 60), 'yrange': 0,
+              'yrange2': (5, 30), 's1_count': (30, 80), 's2_count': (6, 20)},
+    'pronk': {'x0': (0, 19.5), 'y0': (25, 50), 'xrange': (10, 60), 'yrange': 0,
+              'yrange2': (5, 30), 's1_count': (30, 80), 's2_count': (6, 20)},
+}
+
+# Stride scales each stack type's generator needs (see gait_generator)
+STRIDE_SCALES = {
+    'trot': (1.0, 0.75, 0.5, -1.0, -0.75, -0.5),
+    'walk': (1.0, -1.0),
+    'bound': (1.0, -1.0),
+    'pronk': (1.0, -1.0),
+}
+
+# Score columns; the first three are maximized, peak_speed is minimized
+OBJECTIVES = ('stride', 'clearance', 'reach_margin', 'peak_speed')
+
+
+def sample_candidates(stacktype, count, bounds=None, seed=None):
+    """
+    Draw random candidate parameter sets, uniformly within the search bounds.
+
+    Args:
+        stacktype: 'trot', 'walk', 'bound' or 'pronk'
+        count: Number of candidates
+        bounds: Optional dict overriding SEARCH_BOUNDS entries by parameter name
+        seed: Optional random seed
+
+    Returns:
+        (count x 7) float array of [x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
+    """
+    limits = dict(SEARCH_BOUNDS[stacktype])
+    limits.update(bounds or {})
+    rng = np.random.default_rng(seed)
+    params = np.empty((count, len(PARAM_NAMES)))
+    for i, (name, decimals) in enumerate(zip(PARAM_NAMES, PARAM_DECIMALS)):
+        low, high = limits[name] if isinstance(limits[name], (tuple, list)) else (limits[name],) * 2
+        params[:, i] = np.round(rng.uniform(low, high, count), decimals)
+    return params
+
+
+def score_candidates(leg, stacktype, params, rate_hz=200):
+    """
+    Score candidate gaits with the kinematic model.
+
+    Each candidate's stride set is solved as its gait generator would, so a
+    candidate is only feasible if it generates. The full-stride forward and
+    backward cycles are then analyzed together in one vectorized pass, and
+    each score is the worse of the two directions.
+
+    Args:
+        leg: Kinematics solver instance
+        stacktype: 'trot', 'walk', 'bound' or 'pronk'
+        params: (n x 7) array of candidates, see sample_candidates
+        rate_hz: Control rate in Hz
+
+    Returns:
+        (n x 4) float array of OBJECTIVES scores, NaN rows for infeasible candidates
+    """
+    scales = STRIDE_SCALES[stacktype]
+    forward, backward = scales.index(1.0), scales.index(-1.0)
+    cycles, heights, feasible = [], [], []
+    for i, row in enumerate(params):
+        gait_params = [stacktype] + _gait_values(row)
+        moves = generate_stride_set(leg, *gait_params[1:], scales)
+        if any(move is None for move in moves):
+            continue
+        # Both directions side by side, analyzed as two legs
+        cycles.append(np.column_stack((moves[forward], moves[backward])))
+        heights.append(contact_height(gait_params))
+        feasible.append(i)
+
+    scores = np.full((len(params), len(OBJECTIVES)), np.nan)
+    for i, report in zip(feasible, analyze_trajectories(leg, cycles, heights, rate_hz)):
+        if not report['fk_valid'].all():
+            continue
+        scores[i] = (report['stride_length'].min(),
+                     max(0.0, params[i, 1] - report['foot_height_range'][0].max()),
+                     report['reach_margin'].min(),
+                     report['peak_velocity'].max())
+    return scores
+
+
+def pareto_front(scores):
+    """
+    Find the candidates no other candidate beats on every objective.
+
+    Args:
+        scores: (n x 4) OBJECTIVES scores, NaN rows are ignored
+
+    Returns:
+        Indices of the non-dominated rows
+    """
+    candidates = np.flatnonzero(~np.isnan(scores).any(axis=1))
+    values = scores[candidates] * np.array([1, 1, 1, -1])  # All maximized
+    dominated = np.zeros(len(values), dtype=bool)
+    # Compare in blocks so memory stays bounded for large searches
+    for start in range(0, len(values), 512):
+        block = values[start:start + 512, None, :]
+        at_least = (values[None, :, :] >= block).all(axis=2)
+        better = (values[None, :, :] > block).any(axis=2)
+        dominated[start:start + 512] = (at_least & better).any(axis=1)
+    return candidates[~dominated]
+
+
+def tune_gait(leg, stacktype, samples=5000, bounds=None, rate_hz=200, max_speed=None,
+              workers=None, seed=None):
+    """
+    Search the gait parameter space and return the Pareto set.
+
+    Candidates are scored in chunks on a process pool. The caller must then
+    be import-safe for spawned processes (guarded by `if __name__ == '__main__'`).
+
+    Args:
+        leg: Kinematics solver instance
+        stacktype: 'trot', 'walk', 'bound' or 'pronk'
+        samples: Number of random candidates
+        bounds: Optional dict overriding SEARCH_BOUNDS entries by parameter name
+        rate_hz: Control rate in Hz
+        max_speed: Optional servo speed limit in deg/s; faster candidates are rejected
+        workers: Number of worker processes (None = all cores, 1 = no pool)
+        seed: Optional random seed
+
+    Returns:
+        dict: 'params' (m x 7) and 'scores' (m x 4) of the Pareto set sorted
+              by stride, plus 'feasible', the number of candidates that passed
+    """
+    params = sample_candidates(stacktype, samples, bounds, seed)
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and samples > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        # Several chunks per worker keep the pool busy when chunk costs differ
+        chunks = np.array_split(params, min(samples, workers * 4))
+        args = [(leg, stacktype, chunk, rate_hz) for chunk in chunks]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            scores = np.concatenate(list(pool.map(_score_chunk, args)))
+    else:
+        scores = score_candidates(leg, stacktype, params, rate_hz)
+
+    if max_speed is not None:
+        scores[scores[:, 3] > max_speed] = np.nan
+    front = pareto_front(scores)
+    front = front[np.argsort(-scores[front, 0], kind='stable')]
+    return {'params': params[front], 'scores': scores[front],
+            'feasible': int((~np.isnan(scores).any(axis=1)).sum())}
+
+
+def pareto_gaits(stacktype, result, prefix=None):
+    """
+    Turn a tune_gait result into GAITS entries.
+
+    Args:
+        stacktype: Stack type the result was tuned for
+        result: dict returned by tune_gait
+        prefix: Name prefix (defaults to the upper-case stack type)
+
+    Returns:
+        dict: Gait name to [STACKTYPE, x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
+    """
+    prefix = prefix or stacktype.upper()
+    digits = max(2, len(str(len(result['params']))))
+    return {f"{prefix}_{i + 1:0{digits}d}": [stacktype] + _gait_values(row)
+            for i, row in enumerate(result['params'])}
+
+
+def format_gaits(gaits, scores=None):
+    """
+    Format gait definitions as lines for the GAITS dictionary.
+
+    Args:
+        gaits: dict of gait definitions
+        scores: Optional (n x 4) OBJECTIVES scores aligned with gaits, added as comments
+
+    Returns:
+        str: One "'NAME': [...]," line per gait
+    """
+    width = max(len(name) for name in gaits) + 3 if gaits else 0
+    lines = []
+    for i, (name, gait_params) in enumerate(gaits.items()):
+        line = f"    {repr(name) + ':':<{width}} {gait_params!r},"
+        if scores is not None:
+            stride, clearance, margin, speed = scores[i]
+            line += (f"  # stride {stride:.1f} mm, clearance {clearance:.1f} mm, "
+                     f"margin {margin:.1f} mm, {speed:.0f} deg/s")
+        lines.append(line)
+    return "\n".join(lines)
+
+
+#-------------------#
+# Private Functions #
+#-------------------#
+
+def _score_chunk(args):
+    """Process pool entry point for tune_gait."""
+    return score_candidates(*args)
+
+
+def _gait_values(row):
+    """Parameter row as GAITS values: floats for x0 and y0, ints for the rest."""
+    return [round(float(v), d) if d else int(round(v)) for v, d in zip(row, PARAM_DECIMALS)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Q8bot gait parameter auto-tuner')
+    parser.add_argument('stacktype', choices=sorted(SEARCH_BOUNDS), help='Gait stack type to tune')
+    parser.add_argument('--samples', type=int, default=5000, help='Number of random candidates')
+    parser.add_argument('--max-speed', type=float, help='Servo speed limit in deg/s')
+    parser.add_argument('--rate', type=float, default=200, help='Control rate in Hz')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: all cores)')
+    parser.add_argument('--seed', type=int, help='Random seed')
+    parser.add_argument('--prefix', help='Gait name prefix')
+    parser.add_argument('--fix', nargs=2, action='append', default=[], metavar=('PARAM', 'VALUE'),
+                        help='Hold a parameter fixed, e.g. --fix y0 43.36')
+    args = parser.parse_args()
+
+    fixed = {name: float(value) for name, value in args.fix}
+    leg = k_solver()
+    result = tune_gait(leg, args.stacktype, args.samples, fixed, args.rate, args.max_speed,
+                       args.workers, args.seed)
+    print(f"# {result['feasible']} of {args.samples} candidates feasible, "
+          f"{len(result['params'])} on the Pareto set")
+    print(format_gaits(pareto_gaits(args.stacktype, result, args.prefix), result['scores']))
+
+    # Current definitions of this stack type, for comparison
+    current = {name: gait for name, gait in GAITS.items() if gait[0] == args.stacktype}
+    if current:
+        rows = np.array([gait[1:] for gait in current.values()], dtype=float)
+        print("# Current GAITS entries:")
+        print(format_gaits(current, score_candidates(leg, args.stacktype, rows, args.rate)))
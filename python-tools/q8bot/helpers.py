@@ -4,6 +4,7 @@ Written by yufeng.wu0902@gmail.com
 Helper functions for operate.py.
 '''
 
+import os
 import serial.tools.list_ports
 import logging
 import sys
@@ -161,12 +162,31 @@ class XiaoPortFinder:
     Utility class for detecting and validating Seeed Studio XIAO ESP32C3 devices.
 
     The XIAO ESP32C3 is identified by its unique USB Vendor ID (VID) and Product ID (PID).
+    Other ports, such as a simulator's pty, are accepted too once added with
+    add_port() or listed in the Q8_EXTRA_PORTS environment variable
+    (separated by os.pathsep).
     """
 
     # Seeed Studio XIAO ESP32C3 USB identifiers
     VID = 0x303A
     PID = 0x1001
 
+    # Ports accepted regardless of VID/PID
+    EXTRA_PORTS = []
+    ENV_EXTRA_PORTS = 'Q8_EXTRA_PORTS'
+
+    @classmethod
+    def add_port(cls, com_port):
+        """Accept a port that is not a XIAO device (e.g. a simulator's pty)."""
+        if com_port not in cls.EXTRA_PORTS:
+            cls.EXTRA_PORTS.append(com_port)
+
+    @classmethod
+    def extra_ports(cls):
+        """Get the ports accepted regardless of VID/PID."""
+        env_ports = [p for p in os.environ.get(cls.ENV_EXTRA_PORTS, '').split(os.pathsep) if p]
+        return cls.EXTRA_PORTS + [p for p in env_ports if p not in cls.EXTRA_PORTS]
+
     @classmethod
     def find(cls):
         """
@@ -184,7 +204,8 @@ class XiaoPortFinder:
         for port in ports:
             if port.vid == cls.VID and port.pid == cls.PID:
                 return port.device
-        return None
+        extra = cls.extra_ports()
+        return extra[0] if extra else None
 
     @classmethod
     def validate(cls, com_port):
@@ -201,6 +222,8 @@ class XiaoPortFinder:
             >>> if XiaoPortFinder.validate("COM3"):
             ...     print("COM3 is a valid XIAO device")
         """
+        if com_port in cls.extra_ports():
+            return True
         ports = serial.tools.list_ports.comports()
         for port in ports:
             if port.device == com_port and port.vid == cls.VID and port.pid == cls.PID:
@@ -224,7 +247,7 @@ class XiaoPortFinder:
         for port in ports:
             if port.vid == cls.VID and port.pid == cls.PID:
                 xiao_ports.append(port.device)
-        return xiao_ports
+        return xiao_ports + cls.extra_ports()
 
 
 
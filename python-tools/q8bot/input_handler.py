@@ -5,19 +5,73 @@ Unified input handler for Q8bot control.
 Abstracts keyboard and joystick input into a common interface.
 '''
 
+import threading
+from collections import namedtuple
 import pygame
 from control_config import (
     KEYBOARD_MAPPING,
+    JOYSTICK_MOVEMENT,
     check_joystick_compatible,
     get_joystick_mapping,
     apply_deadzone,
-    get_joystick_direction
+    get_joystick_direction,
+    get_joystick_leg_scales
 )
 from helpers import Q8Logger
 
 
+class InputSnapshot(namedtuple('InputSnapshot', ['direction', 'leg_scales', 'actions'])):
+    """
+    Immutable copy of the input state, with the same query interface as InputHandler.
+
+    Taken on the main thread by InputHandler.snapshot(), so other threads
+    (e.g. the control loop) can read input without touching pygame.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, direction=None, leg_scales=None, actions=frozenset()):
+        return super().__new__(cls, direction, leg_scales, frozenset(actions))
+
+    def get_movement_direction(self):
+        return self.direction
+
+    def get_leg_scales(self):
+        return self.leg_scales
+
+    def is_movement_input(self):
+        return self.direction is not None
+
+    def is_action_pressed(self, action_name):
+        return action_name in self.actions
+
+
+class InputSlot:
+    """Holds the latest InputSnapshot, handed from the main thread to the control thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = InputSnapshot()
+
+    def put(self, snapshot):
+        """Replace the held snapshot."""
+        with self._lock:
+            self._snapshot = snapshot
+
+    def get(self):
+        """Get the latest snapshot."""
+        with self._lock:
+            return self._snapshot
+
+
 class InputHandler:
-    """Unified input handler for both keyboard and joystick."""
+    """
+    Unified input handler for both keyboard and joystick.
+
+    pygame input may only be read on the main thread, after its event queue
+    has been processed (pygame.event.get or pygame.event.pump). Use
+    snapshot() to pass the input to other threads.
+    """
 
     def __init__(self, use_joystick=False, joystick=None, joystick_mapping=None):
         """
@@ -42,7 +96,6 @@ class InputHandler:
                 For keyboard: Returns 6 basic commands (f, b, l, r, fl, fr)
         """
         if self.use_joystick:
-            pygame.event.pump()
             axes = self.joystick_mapping['axes'] if self.joystick_mapping else {
                 'horizontal': 0, 'vertical': 1, 'deadzone': 0.1
             }
@@ -71,6 +124,28 @@ class InputHandler:
                 return 'fr_0.75'  # Map to moderate forward-right turn
             return None
 
+    def get_leg_scales(self):
+        """
+        Get continuous per-leg stride scales from the joystick.
+
+        Only available with a joystick when JOYSTICK_MOVEMENT['continuous_stride']
+        is enabled; otherwise movement uses get_movement_direction().
+
+        Returns:
+            tuple: Stride scales (FL, FR, BL, BR) or None if unavailable or no input
+        """
+        if not self.use_joystick or not JOYSTICK_MOVEMENT.get('continuous_stride'):
+            return None
+
+        axes = self.joystick_mapping['axes'] if self.joystick_mapping else {
+            'horizontal': 0, 'vertical': 1, 'deadzone': 0.1
+        }
+        deadzone = axes.get('deadzone', 0.1)
+
+        axis0 = apply_deadzone(self.joystick.get_axis(axes['horizontal']), deadzone)
+        axis1 = apply_deadzone(self.joystick.get_axis(axes['vertical']), deadzone)
+        return get_joystick_leg_scales(axis0, axis1)
+
     def is_movement_input(self):
         """
         Check if any movement input is active.
@@ -91,7 +166,6 @@ class InputHandler:
             bool: True if action is pressed
         """
         if self.use_joystick:
-            pygame.event.pump()
             if self.joystick_mapping and action_name in self.joystick_mapping['actions']:
                 button_num = self.joystick_mapping['actions'][action_name]
                 return self.joystick.get_button(button_num)
@@ -103,6 +177,23 @@ class InputHandler:
                 return keys[KEYBOARD_MAPPING['actions'][action_name]]
             return False
 
+    def snapshot(self):
+        """
+        Read the whole input state at once. Call on the main thread.
+
+        Returns:
+            InputSnapshot: Movement direction, leg scales (None without movement
+                           input) and the set of pressed action names
+        """
+        direction = self.get_movement_direction()
+        leg_scales = self.get_leg_scales() if direction is not None else None
+        if self.use_joystick:
+            action_names = self.joystick_mapping['actions'] if self.joystick_mapping else {}
+        else:
+            action_names = KEYBOARD_MAPPING['actions']
+        actions = [name for name in action_names if self.is_action_pressed(name)]
+        return InputSnapshot(direction, leg_scales, actions)
+
 
 def detect_and_init_joystick():
     """
@@ -11,6 +11,9 @@ from scipy.optimize import fsolve
 # d - distance between motors; l1/l1p - upper linkage length; l2/l2p - lower linkage length
 # Unit is in mm.
 class k_solver:
+    # Workspace map cell states, see build_workspace
+    CELL_OUT, CELL_IN, CELL_EDGE = 0, 1, 2
+
     def __init__(self, d = 19.5, l1 = 25, l2 = 40, l1p = 25, l2p = 40):
         self.d = d
         self.l1 = l1
@@ -19,15 +22,86 @@ class k_solver:
         self.l2p = l2p
         self.prev_ik = [45, 135]
         self.prev_est = [self.d/2, (self.l1 + self.l2)]
+        self.ik_table = None
+        self.workspace = None
+        self.use_ik_table = False
 
-    # Check whether a solution exist. To be completed later.
+    # Check whether a solution exists using the reachable-workspace map,
+    # which is built on first use. Points below the motors are rejected.
     def ik_check(self, x, y):
         if y < 0:
             return False
-        return True
+        if self.workspace is None:
+            self.build_workspace()
+        ws = self.workspace
+        i = int((x - ws['origin'][0]) / ws['step'])
+        j = int((y - ws['origin'][1]) / ws['step'])
+        rows, cols = ws['map'].shape
+        if x < ws['origin'][0] or i >= cols or j >= rows:
+            return False
+        cell = ws['map'][j, i]
+        if cell == self.CELL_EDGE:
+            return bool(self._ik_exact_batch(np.float64(x), np.float64(y), True, None)[2])
+        return cell == self.CELL_IN
+
+    # ik_check for arrays of points. Same answers, with exact IK run only for
+    # points in edge cells.
+    def ik_check_batch(self, xs, ys):
+        x = np.asarray(xs, dtype=float)
+        y = np.asarray(ys, dtype=float)
+        if self.workspace is None:
+            self.build_workspace()
+        ws = self.workspace
+        rows, cols = ws['map'].shape
+        i = np.floor((x - ws['origin'][0]) / ws['step']).astype(int)
+        j = np.floor((y - ws['origin'][1]) / ws['step']).astype(int)
+        inside = (y >= 0) & (i >= 0) & (i < cols) & (j < rows)
+        cell = np.where(inside, ws['map'][np.where(inside, j, 0), np.where(inside, i, 0)], self.CELL_OUT)
+        ok = cell == self.CELL_IN
+        edge = cell == self.CELL_EDGE
+        if edge.any():
+            ok[edge] = self._ik_exact_batch(x[edge], y[edge], True, None)[2]
+        return ok
+
+    # Precompute a map of the reachable workspace over a regular (x, y) grid.
+    # A point is reachable when its distance to each motor lies between the
+    # difference and the sum of that side's link lengths. Each cell is marked
+    # CELL_IN or CELL_OUT when its whole area is provably on one side of those
+    # limits (with a margin well above rounding error), and CELL_EDGE when a
+    # limit may cross it, so ik_check agrees with exact IK everywhere.
+    def build_workspace(self, step = 0.25, margin = 1e-6):
+        reach = max(self.l1 + self.l2, self.l1p + self.l2p)
+        gx = np.arange(-reach - step, self.d + reach + step, step)
+        gy = np.arange(0, reach + step, step)
+        x0, y0 = np.meshgrid(gx, gy)
+        x1, y1 = x0 + step, y0 + step
+        inside = y0 >= step  # Near y = 0 the motor angles round badly
+        outside = np.zeros(x0.shape, dtype=bool)
+        for mx, l1, l2 in ((self.d, self.l1, self.l2), (0, self.l1p, self.l2p)):
+            # Nearest and farthest distance from the motor to each cell
+            near = np.hypot(np.maximum(np.maximum(x0 - mx, mx - x1), 0), np.maximum(y0, 0))
+            far = np.hypot(np.maximum(abs(x0 - mx), abs(x1 - mx)), y1)
+            r_min, r_max = abs(l1 - l2), l1 + l2
+            inside &= (near >= r_min + margin) & (far <= r_max - margin)
+            outside |= (far < r_min - margin) | (near > r_max + margin)
+        cells = np.full(x0.shape, self.CELL_EDGE, dtype=np.int8)
+        cells[inside] = self.CELL_IN
+        cells[outside] = self.CELL_OUT
+        self.workspace = {
+            'origin': (float(gx[0]), float(gy[0])),
+            'step': float(step),
+            'map': cells,
+        }
+        return self.workspace
 
     # Solve inverse kinematics at an given end effector position
     def ik_solve(self, x, y, deg = True, rounding = 3):
+        if self.use_ik_table and self.ik_table is not None:
+            q = self._ik_table_lookup(x, y)
+            if q is not None:
+                q1, q2 = q if deg else (self._deg2rad(q[0]), self._deg2rad(q[1]))
+                self.prev_ik = [q1, q2]
+                return round(q1, rounding), round(q2, rounding), True
         try:
             c1 = math.sqrt((x - self.d)**2 + y**2)
             c2 = math.sqrt(x**2 + y**2)
@@ -43,23 +117,213 @@ class k_solver:
             return np.round(q1, rounding), np.round(q2, rounding), True
         except:
             return self.prev_ik[0], self.prev_ik[1], False
-    
+
+    # Solve inverse kinematics for arrays of end effector positions in one pass.
+    # Unreachable points come back as NaN and are flagged False in valid_mask.
+    # Always exact: vectorized exact IK is faster than the table's gathers
+    # (use ik_table_solve to query the table for many points).
+    def ik_solve_batch(self, xs, ys, deg = True, rounding = 3):
+        x = np.asarray(xs, dtype=float)
+        y = np.asarray(ys, dtype=float)
+        return self._ik_exact_batch(x, y, deg, rounding)
+
+    # Precompute q1/q2 over a regular (x, y) grid for the current linkage
+    # dimensions and enable table lookups in ik_solve. Interpolation error
+    # grows steeply towards the workspace edge (over 3 deg there with the
+    # default grid), so every cell is checked against exact IK at a 5 x 5 set
+    # of interior points, and cells above tolerance (deg) are left to exact
+    # IK. Returns the worst error found in the cells kept; elsewhere in those
+    # cells the error stays within about 1.1 x that.
+    def build_ik_table(self, x_lim = (-30, 50), y_lim = (5, 65), step = 0.5, tolerance = 0.02):
+        gx = np.arange(x_lim[0], x_lim[1] + step/2, step)
+        gy = np.arange(y_lim[0], y_lim[1] + step/2, step)
+        X, Y = np.meshgrid(gx, gy)
+        q1, q2, _ = self._ik_exact_batch(X, Y, True, None)
+
+        err = np.zeros((len(gy) - 1, len(gx) - 1))
+        checks = (0.05, 0.25, 0.5, 0.75, 0.95)
+        for tx in checks:
+            for ty in checks:
+                q1e, q2e, _ = self._ik_exact_batch(X[:-1, :-1] + tx*step, Y[:-1, :-1] + ty*step, True, None)
+                for q, qe in ((q1, q1e), (q2, q2e)):
+                    qt = ((q[:-1, :-1] * (1 - tx) + q[:-1, 1:] * tx) * (1 - ty) +
+                          (q[1:, :-1] * (1 - tx) + q[1:, 1:] * tx) * ty)
+                    err = np.maximum(err, np.abs(qt - qe))  # NaN (unreachable) stays NaN
+        with np.errstate(invalid='ignore'):
+            cell_ok = err <= tolerance
+        self._set_ik_table({
+            'geometry': self._geometry(),
+            'origin': (float(gx[0]), float(gy[0])),
+            'step': float(step),
+            'q1': q1,
+            'q2': q2,
+            'cell_ok': cell_ok,
+            'max_error': float(err[cell_ok].max()) if cell_ok.any() else 0.0,
+        })
+        return self.ik_table['max_error']
+
+    # Answer IK queries from the precomputed table by bilinear interpolation.
+    # Points outside the grid or in cells that exceed the table's tolerance
+    # are flagged False in valid_mask and return NaN. Without a table every
+    # point is.
+    def ik_table_solve(self, xs, ys, deg = True, rounding = 3):
+        table = self.ik_table
+        x = np.asarray(xs, dtype=float)
+        y = np.asarray(ys, dtype=float)
+        if table is None:
+            nan = np.full(np.broadcast(x, y).shape, np.nan)
+            return nan, nan.copy(), np.zeros(nan.shape, dtype=bool)
+        ny, nx = table['q1'].shape
+        fx = (x - table['origin'][0]) / table['step']
+        fy = (y - table['origin'][1]) / table['step']
+        i = np.clip(np.floor(fx), 0, nx - 2).astype(int)
+        j = np.clip(np.floor(fy), 0, ny - 2).astype(int)
+        inside = ((fx >= 0) & (fx <= nx - 1) & (fy >= 0) & (fy <= ny - 1) &
+                  table['cell_ok'][j, i])
+        tx = fx - i
+        ty = fy - j
+        angles = []
+        for grid in (table['q1'], table['q2']):
+            q = ((grid[j, i] * (1 - tx) + grid[j, i + 1] * tx) * (1 - ty) +
+                 (grid[j + 1, i] * (1 - tx) + grid[j + 1, i + 1] * tx) * ty)
+            angles.append(np.where(inside, q, np.nan))
+        q1, q2 = angles
+        if not deg:
+            q1, q2 = self._deg2rad(q1), self._deg2rad(q2)
+        valid_mask = np.isfinite(q1) & np.isfinite(q2)
+        if rounding is not None:
+            q1, q2 = np.round(q1, rounding), np.round(q2, rounding)
+        return q1, q2, valid_mask
+
+    # Save the IK table to an .npz file together with the linkage geometry.
+    # Returns False if no table has been built or loaded.
+    def save_ik_table(self, path):
+        table = self.ik_table
+        if table is None:
+            return False
+        np.savez(path, geometry=np.array(table['geometry']),
+                 origin=np.array(table['origin']), step=table['step'],
+                 q1=table['q1'], q2=table['q2'], cell_ok=table['cell_ok'],
+                 max_error=table['max_error'])
+        return True
+
+    # Load an IK table saved by save_ik_table. Returns False, leaving the
+    # solver unchanged, if the file is missing, predates per-cell tolerances
+    # or was built for a different linkage geometry.
+    def load_ik_table(self, path):
+        try:
+            data = np.load(path)
+        except (OSError, ValueError):
+            return False
+        with data:
+            if 'cell_ok' not in data.files or not np.allclose(data['geometry'], self._geometry()):
+                return False
+            self._set_ik_table({
+                'geometry': self._geometry(),
+                'origin': tuple(float(v) for v in data['origin']),
+                'step': float(data['step']),
+                'q1': data['q1'],
+                'q2': data['q2'],
+                'cell_ok': data['cell_ok'],
+                'max_error': float(data['max_error']),
+            })
+        return True
+
+    # Default file name for an IK table built with this linkage geometry.
+    def ik_table_name(self):
+        return "ik_table_" + "_".join(f"{v:g}" for v in self._geometry()) + ".npz"
+
     # Check whether a solution exist. To be completed later.
     def fk_check(self):
         return True
     
-    # Solve inverse kinematics at an given end effector position
-    def fk_solve(self, q1, q2, deg = True, rounding = 3):
+    # Solve forward kinematics at given joint angles. The foot is the
+    # intersection of the two lower-link circles around the knees; branch = 1
+    # picks the usual configuration with the foot below the knees.
+    def fk_solve(self, q1, q2, deg = True, rounding = 3, branch = 1):
+        x, y, valid = self.fk_solve_batch(q1, q2, deg, None, branch)
+        return round(float(x), rounding), round(float(y), rounding)
+
+    # Closed-form forward kinematics for arrays of joint angles in one pass.
+    # Configurations where the knees are out of reach return NaN and are
+    # flagged False in valid_mask.
+    def fk_solve_batch(self, q1s, q2s, deg = True, rounding = 3, branch = 1):
+        q1 = np.asarray(q1s, dtype=float)
+        q2 = np.asarray(q2s, dtype=float)
+        if deg:
+            q1, q2 = self._deg2rad(q1), self._deg2rad(q2)
+        Xa = self.l1 * np.cos(q1) + self.d
+        Ya = self.l1 * np.sin(q1)
+        Xb = self.l1p * np.cos(q2)
+        Yb = self.l1p * np.sin(q2)
+        ux, uy = Xa - Xb, Ya - Yb
+        dist = np.hypot(ux, uy)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            a = (self.l2p**2 - self.l2**2 + dist**2) / (2*dist)
+            h = np.sqrt(self.l2p**2 - a**2) * branch
+            x = Xb + (a*ux - h*uy) / dist
+            y = Yb + (a*uy + h*ux) / dist
+        valid_mask = np.isfinite(x) & np.isfinite(y)
+        if rounding is not None:
+            x, y = np.round(x, rounding), np.round(y, rounding)
+        return x, y, valid_mask
+
+    # Numerical forward kinematics, kept as a reference for fk_solve.
+    def fk_solve_numeric(self, q1, q2, deg = True, rounding = 3):
+        angles = (q1, q2)
         if deg:
             angles = (self._deg2rad(q1), self._deg2rad(q2))
         x, y = fsolve(self._fk_calc, [10,60], args=angles)
-        # x, y = fsolve(self._fk_calc, self.prev_est, args=angles)
-        # self.prev_est = [x, y]
         return round(x, rounding), round(y, rounding)
 
     #-------------------#
     # Private Functions #
     #-------------------#
+    def _ik_exact_batch(self, x, y, deg, rounding):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            c1 = np.sqrt((x - self.d)**2 + y**2)
+            c2 = np.sqrt(x**2 + y**2)
+            a1 = np.arccos((c1**2 + self.d**2 - c2**2) / (2*c1*self.d))
+            a2 = np.arccos((c2**2 + self.d**2 - c1**2) / (2*c2*self.d))
+            b1 = np.arccos((c1**2 + self.l1**2 - self.l2**2) / (2*c1*self.l1))
+            b2 = np.arccos((c2**2 + self.l1p**2 - self.l2p**2) / (2*c2*self.l1p))
+        q1 = math.pi - a1 - b1
+        q2 = a2 + b2
+        if deg:
+            q1, q2 = q1*180/math.pi, q2*180/math.pi
+        valid_mask = np.isfinite(q1) & np.isfinite(q2)
+        if rounding is not None:
+            q1, q2 = np.round(q1, rounding), np.round(q2, rounding)
+        return q1, q2, valid_mask
+
+    def _set_ik_table(self, table):
+        # Nested lists make single-point lookups much cheaper than NumPy indexing
+        table['rows'] = (table['q1'].tolist(), table['q2'].tolist(), table['cell_ok'].tolist())
+        self.ik_table = table
+        self.use_ik_table = True
+
+    def _ik_table_lookup(self, x, y):
+        # Bilinear table lookup for one point in deg, None if the table cannot answer
+        table = self.ik_table
+        q1_rows, q2_rows, cell_ok = table['rows']
+        fx = (x - table['origin'][0]) / table['step']
+        fy = (y - table['origin'][1]) / table['step']
+        if fx < 0 or fy < 0:
+            return None
+        i, j = int(fx), int(fy)
+        if j >= len(cell_ok) or i >= len(cell_ok[0]) or not cell_ok[j][i]:
+            return None
+        tx, ty = fx - i, fy - j
+        angles = []
+        for rows in (q1_rows, q2_rows):
+            r0, r1 = rows[j], rows[j + 1]
+            angles.append((r0[i] * (1 - tx) + r0[i + 1] * tx) * (1 - ty) +
+                          (r1[i] * (1 - tx) + r1[i + 1] * tx) * ty)
+        return angles
+
+    def _geometry(self):
+        return (self.d, self.l1, self.l2, self.l1p, self.l2p)
+
     def _fk_calc(self, x, *angle):
         q1, q2 = angle
         Xa = self.l1 * math.cos(q1) + self.d
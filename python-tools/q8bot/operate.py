@@ -3,18 +3,25 @@ Written by yufeng.wu0902@gmail.com
 
 This is the latest control script for Q8bot (using ESPNow). Run this script 
 in your laptop with an ESP32C3 connected and control the robot via keyboard.
+Use --headless to run without a window, taking commands from a script file,
+stdin or a socket instead (see script_input.py).
 '''
 
+import os
 import time
-import pygame
 import sys
 import argparse
 from kinematics_solver import k_solver
 from espnow import q8_espnow
 from helpers import XiaoPortFinder, Q8Logger
 from gait_manager import GaitManager, GAITS
-from routine_generator import show_range, greet
-from input_handler import InputHandler, detect_and_init_joystick
+from trajectory_cache import TrajectoryCache
+from fleet import Q8Fleet
+from control_scheduler import ControlScheduler
+from data_recorder import DataRecorder, DEFAULT_RECORD_DIR
+from session_log import SessionLogWriter
+from routine_generator import RoutinePlayer
+from script_input import ScriptInputHandler
 
 # Q8bot leg configuration
 CENTER_DIST = 19.5  # Distance between two actuators
@@ -22,7 +29,8 @@ L1 = 25             # Upper leg length
 L2 = 40             # Lower leg length
 
 # Pygame config
-SPEED = 200
+SPEED = 200     # Control rate (gait ticks and commands) in Hz
+UI_RATE = 30    # Window redraw rate in Hz
 res = 0.2
 
 # Helper Functions
@@ -32,10 +40,32 @@ def move_xy(x, y, dur = 0, deg = True):
     q8.move_mirror([q1, q2], dur)
     return success
 
+def rest_pose():
+    """Joint positions of the current rest position, for all four legs."""
+    q1, q2, _ = leg.ik_solve(pos_x, pos_y, True, 1)
+    return [q1, q2] * 4
+
 # Parse command-line arguments
 parser = argparse.ArgumentParser(description='Q8bot control script')
 parser.add_argument('com_port', nargs='?', help='COM port for ESP32C3 (optional, auto-detect if not provided)')
 parser.add_argument('--debug', action='store_true', help='Enable debug logging')
+parser.add_argument('--fleet', nargs='*', metavar='PORT',
+                    help='Control every connected ESP32C3 (or the given ports) as one fleet')
+parser.add_argument('--protocol', choices=['csv', 'binary', 'delta', 'auto'], default='csv',
+                    help="Serial protocol; 'auto' probes the controller, which moves the robot "
+                         "if its controller firmware predates the probe")
+parser.add_argument('--ik-table', action='store_true',
+                    help='Answer single-point IK (move_xy) from a precomputed lookup table, '
+                         'built and saved on first use')
+parser.add_argument('--headless', nargs='?', const='-', metavar='SOURCE',
+                    help="Run without a window, reading commands from SOURCE: a script file, "
+                         "'-' for stdin (default) or tcp:HOST:PORT")
+parser.add_argument('--log', metavar='DIR',
+                    help='Log every command and reply to a new session directory for replay.py')
+parser.add_argument('--sim', action='store_true',
+                    help='Run against a local simulated controller and robot (see simulator.py)')
+parser.add_argument('--smooth', choices=['joint', 'cartesian'],
+                    help='Stream routines as host-side minimum-jerk trajectories')
 args = parser.parse_args()
 
 # Initialize logger
@@ -45,10 +75,26 @@ log = Q8Logger(debug=args.debug)
 movement = False
 exit = False
 record = False
-request = "none"
+hold_until = 0          # Ignore action inputs until this monotonic time
+pending_action = None   # (monotonic time, function) to run later without blocking
+
+# Start a simulated controller if requested (its pty is accepted as a port)
+sim = None
+if args.sim:
+    from simulator import Q8Simulator
+    sim = Q8Simulator()
+    XiaoPortFinder.add_port(sim.start())
+    args.com_port = args.com_port or sim.port
+    log.info(f"Simulated controller on {sim.port}")
 
 # Find a serial port and connect
-if args.com_port:
+if args.fleet is not None:
+    # Fleet mode: every robot gets the same commands
+    fleet_ports = args.fleet or XiaoPortFinder.list_all()
+    if not fleet_ports:
+        log.error("No ESP32C3 controller device found.")
+        sys.exit(1)
+elif args.com_port:
     # User provided a COM port
     com_port = args.com_port
     if not XiaoPortFinder.validate(com_port):
@@ -61,53 +107,100 @@ else:
         log.error("No ESP32C3 controller device found.")
         sys.exit(1)
 
-# Start pygame instance
-pygame.init()
-window = pygame.display.set_mode((1280, 720))
-clock = pygame.time.Clock()
+if args.headless is not None:
+    # No window: commands come from a script, stdin or a socket, logs go to the console
+    input_handler = ScriptInputHandler(args.headless)
+    input_slot = None  # The script handler can be read from any thread
+    joystick = None
+else:
+    import pygame
+    from input_handler import InputHandler, InputSlot, detect_and_init_joystick
+    from control_config import JOYSTICK_MOVEMENT
 
-# Set up pygame surface for logger
-Q8Logger.set_pygame_surface(window)
+    # Start pygame instance
+    pygame.init()
+    window = pygame.display.set_mode((1280, 720))
+    clock = pygame.time.Clock()
 
-# Detect and initialize input device (joystick or keyboard)
-use_joystick, joystick, joystick_mapping = detect_and_init_joystick()
-input_handler = InputHandler(use_joystick, joystick, joystick_mapping)
+    # Set up pygame surface for logger
+    Q8Logger.set_pygame_surface(window)
 
-# Load appropriate instruction image based on input device
-import os
+    # Detect and initialize input device (joystick or keyboard)
+    use_joystick, joystick, joystick_mapping = detect_and_init_joystick()
+    input_handler = InputHandler(use_joystick, joystick, joystick_mapping)
+    input_slot = InputSlot()  # pygame input is read on the main thread, see the UI loop
 
-def get_resource_path(relative_path):
-    """Get absolute path to resource, works for dev and for PyInstaller"""
-    try:
-        # PyInstaller creates a temp folder and stores path in _MEIPASS
-        base_path = sys._MEIPASS
-    except Exception:
-        # Running in development mode
-        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    return os.path.join(base_path, relative_path)
-
-if use_joystick:
-    instruction_image_path = get_resource_path(os.path.join("docs", "Instruction_Joystick.jpg"))
-else:
-    instruction_image_path = get_resource_path(os.path.join("docs", "Instruction_Default.jpg"))
+    # Load appropriate instruction image based on input device
+    def get_resource_path(relative_path):
+        """Get absolute path to resource, works for dev and for PyInstaller"""
+        try:
+            # PyInstaller creates a temp folder and stores path in _MEIPASS
+            base_path = sys._MEIPASS
+        except Exception:
+            # Running in development mode
+            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(base_path, relative_path)
+
+    if use_joystick:
+        instruction_image_path = get_resource_path(os.path.join("docs", "Instruction_Joystick.jpg"))
+    else:
+        instruction_image_path = get_resource_path(os.path.join("docs", "Instruction_Default.jpg"))
 
-try:
-    instruction_image = pygame.image.load(instruction_image_path)
-    # Scale image to fit the available space (1280x570)
-    instruction_image = pygame.transform.scale(instruction_image, (1280, 570))
-    log.info(f"Loaded instruction image: {os.path.basename(instruction_image_path)}")
-except Exception as e:
-    log.warning(f"Failed to load instruction image: {e}")
-    instruction_image = None
+    try:
+        instruction_image = pygame.image.load(instruction_image_path)
+        # Scale image to fit the available space (1280x570)
+        instruction_image = pygame.transform.scale(instruction_image, (1280, 570))
+        log.info(f"Loaded instruction image: {os.path.basename(instruction_image_path)}")
+    except Exception as e:
+        log.warning(f"Failed to load instruction image: {e}")
+        instruction_image = None
 
 # Initialize kinamatics solver and Q8bot ESPNow instance
 leg = k_solver(CENTER_DIST, L1, L2, L1, L2)
-q8 = q8_espnow(com_port)
+if args.ik_table:
+    # Used by move_xy only; gait generation always solves IK exactly
+    ik_table_path = os.path.join(os.path.expanduser('~'), '.q8bot', leg.ik_table_name())
+    if not leg.load_ik_table(ik_table_path):
+        max_error = leg.build_ik_table()
+        os.makedirs(os.path.dirname(ik_table_path), exist_ok=True)
+        leg.save_ik_table(ik_table_path)
+        log.info(f"Built IK table, worst interpolation error {max_error:.3f} deg")
+if args.fleet is not None:
+    q8 = Q8Fleet(leg, fleet_ports, GAITS, disk_cache=TrajectoryCache(), protocol=args.protocol)
+    log.info(f"Fleet of {len(q8)} robots")
+else:
+    q8 = q8_espnow(com_port, protocol=args.protocol)
+log.debug(f"Controller protocol: {q8.protocol}")
+# Recorded data is reassembled and saved to disk as it streams in
+if args.fleet is not None:
+    recorders = []
+    for robot in q8.robots:
+        recorder = DataRecorder(os.path.join(DEFAULT_RECORD_DIR, os.path.basename(robot.port)))
+        robot.q8.telemetry_callbacks.append(recorder.handle_record)
+        recorders.append(recorder)
+else:
+    recorders = [DataRecorder()]
+    q8.telemetry_callbacks.append(recorders[0].handle_record)
+session_logs = []
+if args.log:
+    if args.fleet is not None:
+        for robot in q8.robots:
+            session_logs.append(SessionLogWriter(os.path.join(args.log, os.path.basename(robot.port))))
+            session_logs[-1].attach(robot.q8)
+    else:
+        session_logs.append(SessionLogWriter(args.log))
+        session_logs[-1].attach(q8)
+q8.start_writer()  # Serial writes happen off the main loop
+q8.start_reader()  # Controller replies are parsed off the main loop
 q8.enable_torque()
 
 # Initialize GaitManager
 gait_names = list(GAITS.keys())
-gait_manager = GaitManager(leg, GAITS)
+if args.fleet is not None:
+    gait_manager = q8  # Each robot has its own GaitManager sharing one trajectory store
+else:
+    gait_manager = GaitManager(leg, GAITS, cache_size=len(GAITS),
+                               disk_cache=TrajectoryCache())
 
 # Starting location of leg end effector in x and y
 pos_x = leg.d/2
@@ -119,33 +212,64 @@ if not gait_manager.load_gait(gait_names[0]):
     log.error(f"Failed to load default gait: {gait_names[0]}")
     sys.exit(1)
 
+# Calculate the remaining gaits in the background so switching never stalls
+def on_gait_ready(gait_name, success):
+    if success:
+        log.debug(f"Gait ready: {gait_name}")
+    else:
+        log.warning(f"Failed to prepare gait: {gait_name}")
+
+# Continuous stride needs each gait's stride basis as well
+continuous_stride = args.headless is not None or (use_joystick and JOYSTICK_MOVEMENT['continuous_stride'])
+gait_manager.prefetch_all(on_ready=on_gait_ready, stride_bases=continuous_stride)
+
 time.sleep(2)
 
-while True:
-    clock.tick(SPEED)
-    pygame.event.get()
+def hold(seconds, then = None):
+    """Ignore action inputs for a while, optionally running then() afterwards."""
+    global hold_until, pending_action
+    hold_until = time.monotonic() + seconds
+    pending_action = (hold_until, then) if then else None
 
-    # Clear screen and render logger messages
-    window.fill((0, 0, 0))  # Black background
+def control_step():
+    """One control tick: read inputs, advance the gait and send commands."""
+    global movement, record, exit, pos_x, pos_y, pending_action
+    inputs = input_slot.get() if input_slot is not None else input_handler
 
-    # Draw instruction image below logger (if loaded)
-    if instruction_image is not None:
-        window.blit(instruction_image, (0, 150))  # Position at y=150 (below logger)
+    if pending_action is not None and time.monotonic() >= pending_action[0]:
+        action = pending_action[1]
+        pending_action = None
+        action()
 
-    Q8Logger.render_pygame_messages()  # Draw logger on top
-    pygame.display.flip()
+    if routines.is_active():
+        if inputs.is_movement_input():
+            routines.cancel()  # Walking takes over from a routine
+        else:
+            routines.step()
+            return
 
     if movement:
-        # Get requested direction from input handler
-        requested_direction = input_handler.get_movement_direction()
+        # Get requested direction from the inputs
+        requested_direction = inputs.get_movement_direction()
 
         if requested_direction:
-            # Start or switch movement direction
-            if gait_manager.start_movement(requested_direction):
+            # Start or switch movement direction (continuous stride if enabled)
+            leg_scales = inputs.get_leg_scales()
+            if leg_scales is not None:
+                # Fixed turn levels stand in until the stride basis is ready
+                started = (gait_manager.start_analog(leg_scales) or
+                           gait_manager.start_movement(requested_direction))
+            else:
+                started = gait_manager.start_movement(requested_direction)
+
+            if started:
                 # Execute current trajectory
-                pos = gait_manager.tick()
-                if pos:
-                    q8.move_all(pos, 0, record)
+                if args.fleet is not None:
+                    q8.step(record)
+                else:
+                    pos = gait_manager.tick()
+                    if pos is not None:
+                        q8.move_all(pos, 0, record)
             else:
                 # Failed to start movement
                 movement = False
@@ -156,27 +280,31 @@ while True:
             record = False
             gait_manager.stop()
             movement = False
+    elif time.monotonic() < hold_until:
+        return
     else:
         # Check for movement input
-        if input_handler.is_movement_input():
+        if inputs.is_movement_input():
             movement = True
         # Check action inputs using generalized interface
-        elif input_handler.is_action_pressed('reset'):
+        elif inputs.is_action_pressed('reset'):
             log.info("Gait Reset")
             move_xy(pos_x, pos_y, 500)
-            time.sleep(0.2)
-        elif input_handler.is_action_pressed('jump'):
+            hold(0.2)
+        elif inputs.is_action_pressed('jump'):
             log.info("Jump")
             q8.send_jump()
-            time.sleep(5)
-            move_xy(pos_x, pos_y, 500)
-        elif input_handler.is_action_pressed('switch_gait'):
+            hold(5, lambda: move_xy(pos_x, pos_y, 500))
+        elif inputs.is_action_pressed('switch_gait'):
             # Cycle to next gait
             gait_names.append(gait_names.pop(0))
             new_gait = gait_names[0]
 
             # Load new gait
-            if gait_manager.load_gait(new_gait):
+            if gait_manager.get_gait_status(new_gait) == 'loading':
+                log.info(f"{new_gait} is still loading, try again shortly")
+                gait_names.insert(0, gait_names.pop())  # Revert gait change
+            elif gait_manager.load_gait(new_gait):
                 # Update position to match new gait
                 pos_x, pos_y = GAITS[new_gait][1], GAITS[new_gait][2]
                 move_xy(pos_x, pos_y, 500)
@@ -184,42 +312,84 @@ while True:
             else:
                 log.error(f"Failed to load gait: {new_gait}")
                 gait_names.insert(0, gait_names.pop())  # Revert gait change
-            time.sleep(0.2)
-        elif input_handler.is_action_pressed('battery'):
+            hold(0.2)
+        elif inputs.is_action_pressed('battery'):
             q8.check_battery()
-            request = "battery"
-            time.sleep(0.2)
-        elif input_handler.is_action_pressed('record'):
+            hold(0.2)
+        elif inputs.is_action_pressed('record'):
             log.debug("Record next movement")
             record = True
-            request = "data"
-            time.sleep(0.2)
-        elif input_handler.is_action_pressed('show_range'):
+            hold(0.2)
+        elif inputs.is_action_pressed('show_range'):
             log.info("Show Range")
-            show_range(q8)
-            time.sleep(0.2)
-        elif input_handler.is_action_pressed('greet'):
+            routines.start('show_range', start_pose=rest_pose())
+        elif inputs.is_action_pressed('greet'):
             log.info("Greet")
-            greet(q8)
-            move_xy(pos_x, pos_y, 1000)  # Return to rest position
-            time.sleep(0.2)
-        elif input_handler.is_action_pressed('exit'):
-            break
-        else:
-            try:
-                while q8.serialHandler.in_waiting > 0:  # Check if there is any data waiting to be read
-                    raw_data = q8.serialHandler.readline().decode('utf-8').strip() # Read a line and decode it
-                    raw_data = raw_data.split()
-                    while raw_data and raw_data[-1] == '0':
-                        raw_data.pop()
-                    # print(f"Received data: {raw_data}")
-                    if request == "battery":
-                        log.info(f"Battery: {int(raw_data[0])}%")
-                request = "none"
-            except:
-                log.debug("Data reading failed. Continuing...")
+            routines.start('greet', on_done=lambda: move_xy(pos_x, pos_y, 1000),  # Then return to rest
+                           start_pose=rest_pose())
+        elif inputs.is_action_pressed('exit'):
+            exit = True
+
+# Scripted routines are stepped by the control loop instead of blocking it
+routines = RoutinePlayer(q8, smooth=args.smooth, rate_hz=SPEED, leg=leg)
+
+# Gait ticks and commands run at a fixed rate on their own thread
+scheduler = ControlScheduler(SPEED, control_step)
+scheduler.start()
+if args.headless is not None:
+    # 'analog' commands wait for the current gait's stride basis
+    input_handler.analog_status = lambda: gait_manager.get_gait_status(gait_names[0], stride_basis=True)
+    input_handler.start()  # Script timing starts with the control loop
+
+def handle_telemetry():
+    """Log replies parsed by the serial reader thread (never blocks)."""
+    for reply in q8.poll_telemetry():
+        if reply['type'] == 'battery':
+            log.info(f"Battery: {reply['percent']}%" + (f" ({reply['port']})" if 'port' in reply else ""))
+        elif reply['type'] == 'data':
+            log.debug(f"Received data: {len(reply['values'])} values")
+        elif reply['type'] == 'heartbeat':
+            log.debug(f"Controller RTT: {reply['rtt_ms']}ms")
+    for recorder in recorders:
+        recorder.end_if_idle()
+
+while not exit:
+    if args.headless is not None:
+        time.sleep(1 / UI_RATE)  # Main thread only handles telemetry
+        handle_telemetry()
+        continue
+
+    clock.tick(UI_RATE)
+    pygame.event.get()
+    input_slot.put(input_handler.snapshot())  # Handed to the control thread
+
+    # Clear screen and render logger messages
+    window.fill((0, 0, 0))  # Black background
+
+    # Draw instruction image below logger (if loaded)
+    if instruction_image is not None:
+        window.blit(instruction_image, (0, 150))  # Position at y=150 (below logger)
+
+    Q8Logger.render_pygame_messages()  # Draw logger on top
+    pygame.display.flip()
+    handle_telemetry()
 
+scheduler.stop()
+for recorder in recorders:
+    recorder.end_session()
+log.debug(f"Control timing: {scheduler.jitter_stats()}")
 q8.disable_torque()
+q8.stop_writer()
+q8.stop_reader()
+for session_log in session_logs:
+    session_log.close()
+if sim is not None:
+    sim.stop()
+log.debug(f"Serial writer: {q8.writer_counts}, reader: {q8.reader_counts}")
+if args.fleet is not None:
+    for port, stats in q8.latency_stats().items():
+        log.debug(f"{port}: {stats}")
 if joystick:
     joystick.quit()
-pygame.quit()
+if args.headless is None:
+    pygame.quit()
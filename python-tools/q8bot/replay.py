@@ -0,0 +1,41 @@
+'''
+Replays a session logged with "operate.py --log DIR": the exact command
+stream is sent to the robot again, at the original timing or N times faster.
+'''
+
+import sys
+import argparse
+from espnow import q8_espnow
+from helpers import XiaoPortFinder, Q8Logger
+from session_log import SessionLog, SessionReplay
+
+parser = argparse.ArgumentParser(description='Q8bot session replay')
+parser.add_argument('session_dir', help='Session directory written by operate.py --log')
+parser.add_argument('com_port', nargs='?', help='COM port for ESP32C3 (optional, auto-detect if not provided)')
+parser.add_argument('--speed', type=float, default=1.0, help='Playback speed multiplier')
+parser.add_argument('--start', type=float, default=0.0, help='Log time in seconds to start from')
+parser.add_argument('--end', type=float, help='Log time in seconds to stop at')
+parser.add_argument('--debug', action='store_true', help='Enable debug logging')
+args = parser.parse_args()
+
+log = Q8Logger(debug=args.debug)
+
+session = SessionLog(args.session_dir)
+log.info(f"Session: {len(session.commands)} commands, {len(session.telemetry)} replies, "
+         f"{session.duration:.1f} s")
+
+com_port = args.com_port or XiaoPortFinder.find()
+if com_port is None or not XiaoPortFinder.validate(com_port):
+    log.error("No ESP32C3 controller device found.")
+    sys.exit(1)
+
+q8 = q8_espnow(com_port)
+q8.start_writer(coalesce=False)  # Every logged command is sent, in order
+replay = SessionReplay(session, q8, args.speed)
+try:
+    replay.run(args.start, args.end)
+except KeyboardInterrupt:
+    log.info("Replay interrupted")
+log.info(f"Replayed {replay.sent} commands up to {replay.log_time:.1f} s")
+q8.disable_torque()
+q8.stop_writer()
@@ -6,11 +6,14 @@ This module contains pre-defined via-point sequences and choreographed routines
 for non-locomotion movements like greetings, range demonstrations, etc.
 
 To add to this module, define a set of via points following the existing format,
-and create your own function that moves through the points in your desired 
-manner.
+and declare your routine in ROUTINES as a list of steps. RoutinePlayer plays a
+routine tick by tick without blocking the control loop, either as one
+firmware-profiled command per via point or expanded on the host into a
+minimum-jerk trajectory streamed at the control rate.
 '''
 
 import time
+import numpy as np
 
 # Q8bot range of motion via points
 R1 = [100, 80, 100, 80, 100, 80, 100, 80]
@@ -32,26 +35,268 @@ G4 = [45, 90, -45, 45, 50, 75, 50, 75]
 G5 = [-45, 45, 45, 90, 50, 75, 50, 75]
 G6 = [-90, 45, -90, 45, -90, 45, -90, 45]
 
+# Routines as data. Each step is (via point, move duration in ms, seconds
+# until the next step starts).
+ROUTINES = {
+    'show_range': [(pos, 1000, 1.5) for pos in R],
+    'greet': [(G1, 1000, 1.1), (G2, 1000, 1), (G3, 500, 1)] +
+             [(G4, 200, 0.25), (G5, 200, 0.25)] * 2 +
+             [(G4, 200, 0.25), (G5, 200, 1.0), (G6, 500, 0.7)],
+}
+
+
+def build_schedule(steps):
+    """
+    Turn a list of routine steps into a timed schedule.
+
+    Args:
+        steps: List of (via point, dur ms, hold s) tuples
+
+    Returns:
+        dict: 'times' (start of each step in s from the routine start),
+              'points' (n x 8), 'durs' (ms) and 'length' (total s)
+    """
+    holds = np.array([step[2] for step in steps], dtype=float)
+    return {
+        'times': np.concatenate(([0.0], np.cumsum(holds)[:-1])),
+        'points': np.array([step[0] for step in steps], dtype=float),
+        'durs': np.array([step[1] for step in steps], dtype=int),
+        'length': float(holds.sum()),
+    }
+
+
+def _min_jerk(tau):
+    """Minimum-jerk position profile over normalized time tau in [0, 1]."""
+    return tau**3 * (10 - 15*tau + 6*tau**2)
+
+
+def expand_min_jerk(schedule, rate_hz, start_pose=None, leg=None):
+    """
+    Expand a routine schedule into dense minimum-jerk joint rows at the control rate.
+
+    Each step moves from where the previous move had got to by the step's
+    start time to its via point over the step's duration, then holds.
+
+    Args:
+        schedule: Result of build_schedule()
+        rate_hz: Control rate in Hz (one row per tick)
+        start_pose: Optional 8 joint positions the robot starts from. Without
+                    it the first via point is reached with a firmware-profiled
+                    move and streaming starts at the second step.
+        leg: Optional kinematics solver to interpolate foot positions in
+             Cartesian space instead of joint space. A leg's segment falls
+             back to joint interpolation if any of its foot positions is out
+             of reach, or if IK would not return the via point's own joint
+             angles (e.g. near full extension or on the other FK branch).
+
+    Returns:
+        dict: 'rows' (m x 8 float32, row k at k / rate_hz seconds) and
+              'first_tick' (first row to send)
+    """
+    times, points = schedule['times'], schedule['points']
+    durs = schedule['durs'] / 1000.0
+
+    # Pose at the start of each step (a step may be cut short by the next one)
+    starts = np.empty_like(points)
+    starts[0] = points[0] if start_pose is None else start_pose
+    for i in range(1, len(points)):
+        holds = times[i] - times[i-1]
+        reached = _min_jerk(min(1.0, holds / durs[i-1])) if durs[i-1] > 0 else 1.0
+        starts[i] = starts[i-1] + (points[i-1] - starts[i-1]) * reached
+
+    # Segment and normalized time of every tick, all at once
+    t = np.arange(int(round(schedule['length'] * rate_hz))) / rate_hz
+    seg = np.searchsorted(times, t, side='right') - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = np.where(durs[seg] > 0, (t - times[seg]) / durs[seg], 1.0)
+    s = _min_jerk(np.clip(tau, 0.0, 1.0))[:, None]
+    rows = starts[seg] + (points[seg] - starts[seg]) * s
+
+    if leg is not None:
+        # Interpolate each foot's (x, y) instead, with the same profile
+        q1s, q2s = starts[:, 0::2], starts[:, 1::2]
+        q1e, q2e = points[:, 0::2], points[:, 1::2]
+        xs, ys, valid_s = leg.fk_solve_batch(q1s, q2s, True, None)
+        xe, ye, valid_e = leg.fk_solve_batch(q1e, q2e, True, None)
+        x = xs[seg] + (xe[seg] - xs[seg]) * s
+        y = ys[seg] + (ye[seg] - ys[seg]) * s
+        q1, q2, valid = leg.ik_solve_batch(np.nan_to_num(x), np.nan_to_num(y), True, None)
+
+        # Per step and leg: both ends reproduced by IK, and every tick reachable
+        usable = valid_s & valid_e
+        for qa, qb, xa, ya in ((q1s, q2s, xs, ys), (q1e, q2e, xe, ye)):
+            q1r, q2r, valid_r = leg.ik_solve_batch(np.nan_to_num(xa), np.nan_to_num(ya), True, None)
+            usable &= valid_r & (np.abs(q1r - qa) < 0.5) & (np.abs(q2r - qb) < 0.5)
+        unreachable = ~valid.all(axis=1)
+        np.logical_and.at(usable, seg[unreachable], valid[unreachable])
+        use = usable[seg]
+        rows[:, 0::2] = np.where(use, q1, rows[:, 0::2])
+        rows[:, 1::2] = np.where(use, q2, rows[:, 1::2])
+
+    first_tick = 0 if start_pose is not None or len(times) < 2 else int(np.ceil(times[1] * rate_hz))
+    return {'rows': np.ascontiguousarray(np.round(rows, 1), dtype=np.float32),
+            'first_tick': first_tick}
+
+
+class RoutinePlayer:
+    """
+    Plays routines without blocking: call step() once per control tick.
+
+    Supports pausing, cancelling and a callback when a routine finishes,
+    e.g. to return to a rest pose or start a gait. With smooth set, via
+    points are expanded into minimum-jerk rows (see expand_min_jerk) that
+    are streamed one per tick, like gait trajectories.
+    """
+
+    def __init__(self, q8, routines=None, smooth=None, rate_hz=200, leg=None):
+        """
+        Initialize the player.
+
+        Args:
+            q8: q8_espnow instance (or anything with move_all)
+            routines: Optional dict of routine name to steps (defaults to ROUTINES)
+            smooth: None for firmware-profiled moves, 'joint' or 'cartesian'
+                    for host-side minimum-jerk interpolation
+            rate_hz: Control rate step() is called at (smooth mode only)
+            leg: Kinematics solver, required for smooth='cartesian'
+        """
+        self.q8 = q8
+        self.routines = routines if routines else ROUTINES
+        self.smooth = smooth
+        self.rate_hz = rate_hz
+        self.leg = leg
+        self.schedules = {}  # routine name -> build_schedule() result
+        self.expansions = {}  # (routine name, start pose) -> expand_min_jerk() result
+        self.expansion = None
+        self.firmware_steps = 0
+        self.last_tick = -1
+        self.name = None
+        self.schedule = None
+        self.next_step = 0
+        self.start_time = 0.0
+        self.paused_at = None
+        self.on_done = None
+
+    def start(self, routine, on_done=None, now=None, start_pose=None):
+        """
+        Start a routine, replacing any routine in progress.
+
+        Args:
+            routine: Routine name from routines, or a list of steps
+            on_done: Optional callback run once when the routine completes
+                     (not when it is cancelled)
+            now: Optional monotonic start time
+            start_pose: Optional current 8 joint positions, so smooth mode can
+                        interpolate into the first via point as well
+
+        Returns:
+            bool: True if the routine was started
+        """
+        if isinstance(routine, str):
+            if routine not in self.routines:
+                return False
+            if routine not in self.schedules:
+                self.schedules[routine] = build_schedule(self.routines[routine])
+            self.schedule = self.schedules[routine]
+            self.name = routine
+        else:
+            self.schedule = build_schedule(routine)
+            self.name = 'custom'
+
+        self.expansion = None
+        self.firmware_steps = len(self.schedule['times'])
+        if self.smooth:
+            key = (self.name, None if start_pose is None else tuple(start_pose))
+            self.expansion = self.expansions.get(key) if self.name != 'custom' else None
+            if self.expansion is None:
+                leg = self.leg if self.smooth == 'cartesian' else None
+                self.expansion = expand_min_jerk(self.schedule, self.rate_hz, start_pose, leg)
+                if self.name != 'custom':
+                    self.expansions[key] = self.expansion
+            self.firmware_steps = 0 if start_pose is not None else 1
+        self.last_tick = -1
+        self.next_step = 0
+        self.start_time = time.monotonic() if now is None else now
+        self.paused_at = None
+        self.on_done = on_done
+        return True
+
+    def step(self, now=None):
+        """
+        Send every step that is due. Call once per control tick.
+
+        Returns:
+            bool: True while the routine is still running (or paused)
+        """
+        if self.schedule is None:
+            return False
+        if self.paused_at is not None:
+            return True
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.start_time
+
+        times = self.schedule['times']
+        while self.next_step < self.firmware_steps and times[self.next_step] <= elapsed:
+            i = self.next_step
+            self.q8.move_all(self.schedule['points'][i].tolist(), int(self.schedule['durs'][i]), False)
+            self.next_step += 1
+
+        if self.expansion is not None:
+            # Stream the row for the current time; late ticks skip rows rather than lag
+            rows = self.expansion['rows']
+            tick = min(int(elapsed * self.rate_hz), len(rows) - 1)
+            if tick >= self.expansion['first_tick'] and tick != self.last_tick:
+                self.q8.move_all(rows[tick], 0, False)
+                self.last_tick = tick
+
+        if self.next_step >= self.firmware_steps and elapsed >= self.schedule['length']:
+            on_done = self.on_done
+            self.cancel()
+            if on_done:
+                on_done()
+            return False
+        return True
+
+    def pause(self, now=None):
+        """Hold the routine at its current step."""
+        if self.schedule is not None and self.paused_at is None:
+            self.paused_at = time.monotonic() if now is None else now
+
+    def resume(self, now=None):
+        """Continue a paused routine where it left off."""
+        if self.paused_at is not None:
+            now = time.monotonic() if now is None else now
+            self.start_time += now - self.paused_at
+            self.paused_at = None
+
+    def cancel(self):
+        """Stop the routine; no further steps or callback are sent."""
+        self.name = None
+        self.schedule = None
+        self.expansion = None
+        self.paused_at = None
+        self.on_done = None
+
+    def is_active(self):
+        """Check if a routine is running or paused."""
+        return self.schedule is not None
+
+    def is_paused(self):
+        """Check if the current routine is paused."""
+        return self.paused_at is not None
+
+
+def play_routine(q8, routine):
+    """Play a routine to completion, blocking the caller."""
+    player = RoutinePlayer(q8)
+    player.start(routine)
+    while player.step():
+        time.sleep(0.005)
+
 
 def show_range(q8):
-    for pos in R:
-        q8.move_all(pos, 1000, False)
-        time.sleep(1.5)
-    return
+    play_routine(q8, 'show_range')
 
 
 def greet(q8):
-    q8.move_all(G1, 1000, False)
-    time.sleep(1.1)
-    q8.move_all(G2, 1000, False)
-    time.sleep(1)
-    q8.move_all(G3, 500, False)
-    time.sleep(1)
-    for _ in range(3):
-        q8.move_all(G4, 200, False)
-        time.sleep(0.25)
-        q8.move_all(G5, 200, False)
-        time.sleep(0.25)
-    time.sleep(0.75)
-    q8.move_all(G6, 500, False)
-    time.sleep(0.7)
+    play_routine(q8, 'greet')
@@ -0,0 +1,173 @@
+'''
+Text command input for running Q8bot headless (no pygame window).
+Provides the same interface as InputHandler, with commands read from a
+script file, stdin or a TCP socket, one per line:
+
+    move f          Hold a movement direction (f, b, l, r, fl_0.75, ...)
+    analog 1 1 0 0  Hold continuous per-leg stride scales (FL FR BL BR)
+    stop            Release movement
+    wait 2.5        Pause this input source before its next command
+    battery         Press an action once (reset, jump, switch_gait, battery,
+                    record, show_range, greet, exit)
+
+Lines starting with '#' are ignored. An 'analog' command is held back while
+the current gait's stride basis is still loading (see analog_status); the
+previous movement command stays in effect until then.
+'''
+
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from helpers import Q8Logger
+
+ACTIONS = ('reset', 'jump', 'switch_gait', 'battery', 'record', 'show_range', 'greet', 'exit')
+
+
+class ScriptInputHandler:
+    """Input handler driven by text commands instead of a keyboard or joystick."""
+
+    def __init__(self, source='-'):
+        """
+        Initialize the handler. Commands are read once start() is called.
+
+        Args:
+            source: Script file path, '-' for stdin, or 'tcp:HOST:PORT' to
+                    listen for connections that send commands
+        """
+        self.source = source
+        self.direction = None
+        self.leg_scales = None
+        self.pending_scales = None  # Latched 'analog' request
+        # Optional callable returning the current gait's stride basis status
+        # ('ready', 'loading', ...); set before start()
+        self.analog_status = None
+        self.pending_actions = deque()
+        self._lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """Start reading commands in a background thread, so script timing starts now."""
+        if self.thread is not None:
+            return
+        target = self._read_socket if self.source.startswith('tcp:') else self._read_stream
+        self.thread = threading.Thread(target=target, name='Q8ScriptInput', daemon=True)
+        self.thread.start()
+
+    def get_movement_direction(self):
+        """
+        Get the movement direction held by the last 'move' or 'analog' command.
+
+        Returns:
+            str: Direction command string, 'analog', or None if no input
+        """
+        with self._lock:
+            self._apply_pending_analog()
+            return self.direction
+
+    def get_leg_scales(self):
+        """
+        Get the per-leg stride scales held by the last 'analog' command.
+
+        Returns:
+            tuple: Stride scales (FL, FR, BL, BR) or None if not in analog mode
+        """
+        with self._lock:
+            self._apply_pending_analog()
+            return self.leg_scales
+
+    def is_movement_input(self):
+        """
+        Check if any movement input is active.
+
+        Returns:
+            bool: True if movement input detected
+        """
+        return self.get_movement_direction() is not None
+
+    def is_action_pressed(self, action_name):
+        """
+        Check if an action is the next one requested. Each request is reported once.
+
+        Args:
+            action_name: str, action name ('greet', 'battery', 'switch_gait', etc.)
+
+        Returns:
+            bool: True if action is pressed
+        """
+        with self._lock:
+            if self.pending_actions and self.pending_actions[0] == action_name:
+                self.pending_actions.popleft()
+                return True
+            return False
+
+    def handle_line(self, line):
+        """
+        Apply one command line.
+
+        Returns:
+            float: Seconds to wait before the next command (non-zero only for 'wait')
+        """
+        words = line.split('#', 1)[0].split()
+        if not words:
+            return 0.0
+        command, params = words[0].lower(), words[1:]
+        try:
+            with self._lock:
+                if command == 'move' and len(params) == 1:
+                    self.direction, self.leg_scales = params[0], None
+                    self.pending_scales = None
+                elif command == 'analog' and len(params) == 4:
+                    self.pending_scales = tuple(float(p) for p in params)
+                    self._apply_pending_analog()
+                elif command == 'stop':
+                    self.direction, self.leg_scales = None, None
+                    self.pending_scales = None
+                elif command == 'wait' and len(params) == 1:
+                    return max(0.0, float(params[0]))
+                elif command in ACTIONS:
+                    self.pending_actions.append(command)
+                else:
+                    Q8Logger.warning(f"Unknown command: {line.strip()}")
+        except ValueError:
+            Q8Logger.warning(f"Invalid command: {line.strip()}")
+        return 0.0
+
+    #-------------------#
+    # Private Functions #
+    #-------------------#
+
+    def _apply_pending_analog(self):
+        """Start a latched analog request unless its stride basis is loading. Caller must hold self._lock."""
+        if self.pending_scales is None:
+            return
+        if self.analog_status is not None and self.analog_status() == 'loading':
+            return
+        self.leg_scales, self.pending_scales = self.pending_scales, None
+        self.direction = 'analog'
+
+    def _read_stream(self):
+        """Read a script file or stdin; the end of input requests exit."""
+        stream = sys.stdin if self.source == '-' else open(self.source)
+        with stream:
+            for line in stream:
+                delay = self.handle_line(line)
+                if delay:
+                    time.sleep(delay)  # Only delays this reader thread
+        self.handle_line('stop')
+        self.handle_line('exit')
+
+    def _read_socket(self):
+        """Accept TCP connections one at a time and apply their commands."""
+        _, host, port = self.source.split(':')
+        server = socket.create_server((host or 'localhost', int(port)))
+        Q8Logger.info(f"Listening for commands on {host or 'localhost'}:{port}")
+        with server:
+            while True:
+                connection, address = server.accept()
+                Q8Logger.debug(f"Command connection from {address}")
+                with connection, connection.makefile('r') as stream:
+                    for line in stream:
+                        self.handle_line(line)
+                self.handle_line('stop')  # Never keep walking after a disconnect
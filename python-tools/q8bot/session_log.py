@@ -0,0 +1,258 @@
+'''
+Session logs: every command sent to the robot and every telemetry record
+received, stored as fixed-size binary records that open instantly with
+np.memmap however long the session was, plus a replay driver that sends a
+logged command stream back through q8_espnow at the original timing or
+faster.
+
+Session directory layout:
+    meta.json       format version, start time, record dtypes
+    commands.bin    COMMAND_DTYPE records, in the order they were written to
+                    the serial port (coalesced motion commands never are)
+    telemetry.bin   TELEMETRY_DTYPE records, in the order they arrived
+Times are seconds since the start of the session.
+'''
+
+import json
+import os
+import threading
+import time
+import numpy as np
+
+LOG_VERSION = 1
+
+# kind: 0 = motion (move_all), 1 = control (torque, battery, record, jump)
+COMMAND_DTYPE = np.dtype([('time', '<f8'), ('kind', 'u1'), ('special', 'u1'),
+                          ('dur', '<u2'), ('torque', 'u1'), ('joints', '<f4', (8,))])
+# kind: 0 = recorded data chunk, 1 = battery, 2 = heartbeat RTT;
+# count is the number of valid entries in values
+TELEMETRY_DTYPE = np.dtype([('time', '<f8'), ('kind', 'u1'), ('count', '<u2'),
+                            ('values', '<u2', (100,))])
+TELEMETRY_KINDS = {'data': 0, 'battery': 1, 'heartbeat': 2}
+
+
+class SessionLogWriter:
+    """
+    Appends commands and telemetry of a running session to a log directory.
+
+    Attach it to a q8_espnow with attach(); afterwards every command written
+    to the serial port and every telemetry record is logged from the thread
+    that writes or parses it.
+    """
+
+    def __init__(self, session_dir):
+        """
+        Create the session directory and open its record files.
+
+        Args:
+            session_dir: Directory to write the log into (must not exist yet)
+        """
+        os.makedirs(session_dir)
+        self.session_dir = session_dir
+        self.start = time.monotonic()
+        meta = {'version': LOG_VERSION, 'start_time': time.time(),
+                'command_dtype': COMMAND_DTYPE.descr, 'telemetry_dtype': TELEMETRY_DTYPE.descr}
+        with open(os.path.join(session_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        self._commands = open(os.path.join(session_dir, 'commands.bin'), 'ab')
+        self._telemetry = open(os.path.join(session_dir, 'telemetry.bin'), 'ab')
+        self._command_lock = threading.Lock()
+        self._telemetry_lock = threading.Lock()
+        self._command_row = np.zeros(1, dtype=COMMAND_DTYPE)
+        self._telemetry_row = np.zeros(1, dtype=TELEMETRY_DTYPE)
+
+    def attach(self, q8):
+        """Log every command written and telemetry record parsed by q8."""
+        q8.command_callbacks.append(self.log_command)
+        q8.telemetry_callbacks.append(self.log_telemetry)
+
+    def log_command(self, kind, joints, special, dur, torque):
+        """Command callback (see q8_espnow.command_callbacks)."""
+        with self._command_lock:
+            row = self._command_row
+            row['time'] = time.monotonic() - self.start
+            row['kind'] = 0 if kind == 'motion' else 1
+            row['special'] = special
+            row['dur'] = dur
+            row['torque'] = torque
+            row['joints'] = 0 if joints is None else joints
+            self._commands.write(row.tobytes())
+
+    def log_telemetry(self, record):
+        """Telemetry callback; text records are not logged."""
+        if record['type'] == 'data':
+            values = record['values'][:100]
+        elif record['type'] == 'battery':
+            values = [record['percent']]
+        elif record['type'] == 'heartbeat' and record['rtt_ms'] is not None:
+            values = [record['rtt_ms']]
+        else:
+            return
+        with self._telemetry_lock:
+            row = self._telemetry_row
+            row['time'] = record['time'] - self.start
+            row['kind'] = TELEMETRY_KINDS[record['type']]
+            row['count'] = len(values)
+            row['values'] = 0
+            row['values'][0, :len(values)] = values
+            self._telemetry.write(row.tobytes())
+
+    def flush(self):
+        """Flush buffered records to disk."""
+        with self._command_lock:
+            self._commands.flush()
+        with self._telemetry_lock:
+            self._telemetry.flush()
+
+    def close(self):
+        """Flush and close the record files."""
+        with self._command_lock:
+            self._commands.close()
+        with self._telemetry_lock:
+            self._telemetry.close()
+
+
+class SessionLog:
+    """
+    Read-only, memory-mapped view of a session log.
+
+    commands and telemetry are structured arrays backed by the files, so
+    only the pages actually touched are read from disk.
+    """
+
+    def __init__(self, session_dir):
+        """
+        Open a session log.
+
+        Args:
+            session_dir: Directory written by SessionLogWriter
+        """
+        with open(os.path.join(session_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta['version'] != LOG_VERSION:
+            raise ValueError(f"Unsupported session log version {self.meta['version']}")
+        self.session_dir = session_dir
+        self.commands = self._map('commands.bin', COMMAND_DTYPE)
+        self.telemetry = self._map('telemetry.bin', TELEMETRY_DTYPE)
+
+    @property
+    def duration(self):
+        """Time of the last logged record in seconds."""
+        ends = [log['time'][-1] for log in (self.commands, self.telemetry) if len(log)]
+        return float(max(ends)) if ends else 0.0
+
+    def command_index(self, t):
+        """Index of the first command at or after time t (binary search)."""
+        return int(np.searchsorted(self.commands['time'], t, side='left'))
+
+    def telemetry_index(self, t):
+        """Index of the first telemetry record at or after time t (binary search)."""
+        return int(np.searchsorted(self.telemetry['time'], t, side='left'))
+
+    def commands_between(self, t0, t1):
+        """Commands with t0 <= time < t1 (a view, not a copy)."""
+        return self.commands[self.command_index(t0):self.command_index(t1)]
+
+    def telemetry_between(self, t0, t1):
+        """Telemetry records with t0 <= time < t1 (a view, not a copy)."""
+        return self.telemetry[self.telemetry_index(t0):self.telemetry_index(t1)]
+
+    def _map(self, name, dtype):
+        path = os.path.join(self.session_dir, name)
+        count = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+class SessionReplay:
+    """
+    Sends a logged command stream through a q8_espnow again.
+
+    Like RoutinePlayer, step() is called once per control tick and sends
+    every command that is due, so replay runs on the control scheduler
+    without blocking. run() replays in a blocking loop instead. Several
+    motion commands can be due in one step, so q8 must send them all in
+    order: either without a writer thread or with start_writer(coalesce=False).
+    """
+
+    # Control command specials and the q8_espnow methods that send them
+    CONTROL_METHODS = {1: 'check_battery', 2: 'record_data', 3: 'finish_recording', 4: 'send_jump'}
+
+    def __init__(self, log, q8, speed=1.0):
+        """
+        Initialize the replay.
+
+        Args:
+            log: SessionLog to replay
+            q8: q8_espnow instance (or Q8Fleet) to send the commands through
+            speed: Playback speed multiplier (2.0 = twice as fast)
+        """
+        self.log = log
+        self.q8 = q8
+        self.speed = speed
+        self.index = 0
+        self.log_time = 0.0
+        self.wall_start = None
+        self.sent = 0
+
+    def seek(self, t):
+        """Continue replay from log time t (seconds), restoring the torque state."""
+        self.index = self.log.command_index(t)
+        self.log_time = t
+        self.wall_start = None
+        if 0 < self.index < len(self.log.commands):
+            if self.log.commands[self.index]['torque']:
+                self.q8.enable_torque()
+            else:
+                self.q8.disable_torque()
+
+    def step(self, now=None):
+        """
+        Send every command that is due.
+
+        Returns:
+            bool: True while commands remain
+        """
+        commands = self.log.commands
+        if self.index >= len(commands):
+            return False
+        now = time.monotonic() if now is None else now
+        if self.wall_start is None:
+            self.wall_start = now - self.log_time / self.speed
+        self.log_time = (now - self.wall_start) * self.speed
+
+        end = self.log.command_index(np.nextafter(self.log_time, np.inf))
+        for command in commands[self.index:end]:
+            self._send(command)
+        self.sent += end - self.index
+        self.index = max(self.index, end)
+        return self.index < len(commands)
+
+    def run(self, start=0.0, end=None, tick=0.005):
+        """
+        Replay from log time start to end (defaults to the whole log), blocking.
+
+        Args:
+            start: Log time in seconds to start from
+            end: Optional log time in seconds to stop at
+            tick: Seconds between steps
+        """
+        self.seek(start)
+        while self.step():
+            if end is not None and self.log_time >= end:
+                break
+            time.sleep(tick)
+
+    def _send(self, command):
+        """Issue one logged command through the q8_espnow interface."""
+        special = int(command['special'])
+        if command['kind'] == 0:
+            self.q8.move_all(command['joints'].tolist(), int(command['dur']), special == 2)
+        elif special == 0:
+            if command['torque']:
+                self.q8.enable_torque()
+            else:
+                self.q8.disable_torque()
+        elif special in self.CONTROL_METHODS:
+            getattr(self.q8, self.CONTROL_METHODS[special])()
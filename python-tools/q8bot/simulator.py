@@ -0,0 +1,302 @@
+'''
+Local stand-in for the ESP32C3 controller and the robot behind it, on a
+pseudo-terminal (Linux/macOS). It speaks the same serial protocol as the
+controller firmware: ';'-terminated CSV commands, binary keyframe/delta frames
+and the protocol probe. It models the servo position profile set by the dur
+field, answers battery and record requests with the controller's 100-integer
+lines, prints heartbeat RTTs, and can add latency, loss and a baud rate limit.
+
+Run it standalone and pass the printed port to operate.py:
+    python simulator.py --latency 0.01 --loss 0.02
+or start one in-process with "operate.py --sim".
+'''
+
+import argparse
+import binascii
+import os
+import random
+import select
+import time
+import tty
+from collections import deque
+import threading
+import numpy as np
+from espnow import (JointStreamDecoder, KEYFRAME_SYNC, KEYFRAME_BODY, KEYFRAME_SIZE,
+                    DELTA_SYNC, DELTA_BODY, DELTA_SIZE, FRAME_CRC, PROTOCOL_VERSIONS)
+from helpers import XiaoPortFinder, Q8Logger
+
+# Robot firmware joint units: 0 to 360 deg is 0 to 4096, offset by one turn
+DXL_PER_DEG = 4096 / 360.0
+DXL_ZERO_OFFSET = 4096
+# Fraction of a profiled move spent accelerating (and decelerating)
+PROFILE_ACCEL = 0.25
+
+
+class Q8Simulator:
+    """
+    Simulated controller and robot on a pty.
+
+    The simulator thread reads commands from the pty, applies them after the
+    configured latency, and writes replies back. Joint positions follow the
+    firmware's time-based profile: a trapezoidal velocity move over dur ms.
+    """
+
+    def __init__(self, latency=0.0, loss=0.0, baud=None, protocol_version=PROTOCOL_VERSIONS['delta'],
+                 battery=87, heartbeat_interval=1.0, initial_pose=None, seed=None):
+        """
+        Create the pty. Call start() to begin serving it.
+
+        Args:
+            latency: One-way delay in seconds for commands and replies
+            loss: Probability in [0, 1] that a command is dropped
+            baud: Optional link speed in bits/s (10 bits per byte), None for unlimited
+            protocol_version: Version answered to the protocol probe (0 = never answer)
+            battery: Battery level in percent reported to battery requests
+            heartbeat_interval: Seconds between heartbeat RTT lines (0 = none)
+            initial_pose: Optional 8 starting joint positions in deg
+            seed: Optional random seed for reproducible loss
+        """
+        self.latency = latency
+        self.loss = loss
+        self.baud = baud
+        self.protocol_version = protocol_version
+        self.battery = battery
+        self.heartbeat_interval = heartbeat_interval
+        self.random = random.Random(seed)
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+
+        pose = np.array(initial_pose if initial_pose is not None else [90] * 8, dtype=float)
+        self.start_pose = pose.copy()
+        self.target = pose.copy()
+        self.move_start = 0.0
+        self.move_dur = 0.0
+        self.torque = False
+        self.recorded = []
+        self.counts = {'received': 0, 'applied': 0, 'dropped': 0, 'crc_errors': 0,
+                       'replies': 0, 'reply_overflows': 0}
+
+        self._buffer = bytearray()
+        self._decoder = JointStreamDecoder()
+        self._incoming = deque()  # (due time, command dict)
+        self._outgoing = deque()  # (due time, bytes)
+        self._link_free = 0.0  # Time the simulated link finishes its current bytes
+        self._next_heartbeat = 0.0
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Start serving the pty on a background thread."""
+        if self._thread is not None:
+            return self.port
+        self._running = True
+        self._next_heartbeat = time.monotonic() + self.heartbeat_interval
+        self._thread = threading.Thread(target=self._run, name='Q8Simulator', daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self, timeout=1.0):
+        """Stop the simulator thread and close the pty."""
+        if self._thread is not None:
+            self._running = False
+            self._thread.join(timeout)
+            self._thread = None
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def positions(self, now=None):
+        """
+        Get the simulated joint positions.
+
+        Returns:
+            np.ndarray: 8 joint positions in deg
+        """
+        now = time.monotonic() if now is None else now
+        if self.move_dur <= 0:
+            return self.target.copy()
+        frac = min(1.0, (now - self.move_start) / self.move_dur)
+        return self.start_pose + (self.target - self.start_pose) * self._profile(frac)
+
+    #-------------------#
+    # Private Functions #
+    #-------------------#
+
+    @staticmethod
+    def _profile(frac):
+        """Fraction of a trapezoidal-velocity move completed at time fraction frac."""
+        a = PROFILE_ACCEL
+        v = 1.0 / (1.0 - a)  # Peak velocity so the move ends at 1
+        if frac < a:
+            return 0.5 * v / a * frac**2
+        if frac <= 1.0 - a:
+            return 0.5 * v * a + v * (frac - a)
+        return 1.0 - 0.5 * v / a * (1.0 - frac)**2
+
+    def _run(self):
+        """Simulator thread: read, apply due commands, send due replies."""
+        while self._running:
+            now = time.monotonic()
+            due = [self._next_heartbeat if self.heartbeat_interval > 0 else now + 0.1]
+            if self._incoming:
+                due.append(self._incoming[0][0])
+            if self._outgoing:
+                due.append(self._outgoing[0][0])
+            timeout = min(0.05, max(0.0, min(due) - now))
+            try:
+                readable, _, _ = select.select([self._master], [], [], timeout)
+            except (OSError, ValueError):
+                return
+            if readable:
+                try:
+                    data = os.read(self._master, 4096)
+                except BlockingIOError:
+                    data = b''
+                except OSError:
+                    return
+                self._receive(data, time.monotonic())
+
+            now = time.monotonic()
+            while self._incoming and self._incoming[0][0] <= now:
+                self._apply(self._incoming.popleft()[1], now)
+            while self._outgoing and self._outgoing[0][0] <= now:
+                self._write(self._outgoing.popleft()[1])
+            if self.heartbeat_interval > 0 and now >= self._next_heartbeat:
+                rtt = int(round((2 * self.latency) * 1000))
+                self._reply(f"[HEARTBEAT] ACK received, RTT: {rtt}ms\n", now)
+                self._next_heartbeat = now + self.heartbeat_interval
+
+    def _link_time(self, size, now):
+        """Time at which size bytes have crossed the link, with the baud limit."""
+        if not self.baud:
+            return now
+        self._link_free = max(self._link_free, now) + size * 10.0 / self.baud
+        return self._link_free
+
+    def _receive(self, data, now):
+        """Split received bytes into commands the way the controller firmware does."""
+        self._buffer.extend(data)
+        while self._buffer:
+            first = self._buffer[0]
+            if first in (KEYFRAME_SYNC, DELTA_SYNC):
+                body, size = (KEYFRAME_BODY, KEYFRAME_SIZE) if first == KEYFRAME_SYNC else (DELTA_BODY, DELTA_SIZE)
+                if len(self._buffer) < size:
+                    return
+                frame = bytes(self._buffer[:size])
+                crc, = FRAME_CRC.unpack_from(frame, body.size)
+                if binascii.crc_hqx(frame[1:body.size], 0) != crc:
+                    self.counts['crc_errors'] += 1
+                    del self._buffer[0]
+                    continue
+                del self._buffer[:size]
+                commands = self._decoder.feed(frame)
+                raw_size = size
+            else:
+                end = self._buffer.find(b';')
+                if end < 0:
+                    return
+                text = self._buffer[:end].decode('utf-8', 'ignore')
+                del self._buffer[:end + 1]
+                raw_size = end + 1
+                if text.startswith(','):
+                    arrival = self._link_time(raw_size, now)
+                    if self.protocol_version:
+                        self._reply(f"[PROTO] {self.protocol_version}\n", arrival)
+                    continue
+                commands = self._parse_csv(text)
+
+            arrival = self._link_time(raw_size, now)
+            for command in commands:
+                self.counts['received'] += 1
+                if self.random.random() < self.loss:
+                    self.counts['dropped'] += 1
+                    continue
+                self._incoming.append((arrival + self.latency, command))
+
+    @staticmethod
+    def _parse_csv(text):
+        """Parse 'j1,...,j8,special,dur,torque' into a command (empty list if malformed)."""
+        fields = text.strip().split(',')
+        if len(fields) != 11:
+            return []
+        try:
+            joints = [float(f) for f in fields[:8]]
+            special, dur, torque = (int(f) for f in fields[8:])
+        except ValueError:
+            return []
+        return [{'joints': joints, 'special': special, 'dur': dur, 'torque': torque}]
+
+    def _apply(self, command, now):
+        """Act on a command as the robot firmware's parseData does."""
+        self.counts['applied'] += 1
+        special = command['special']
+        if special == 1:
+            self._reply_values([self.battery], now)
+            return
+        if special == 3:
+            # Send everything recorded in 100-value chunks, the last zero padded
+            data = self.recorded
+            self.recorded = []
+            for offset in range(0, len(data), 100):
+                self._reply_values(data[offset:offset + 100], now)
+            return
+        if special == 4:
+            return  # Jump routine runs on the robot; joint targets are ignored
+        if bool(command['torque']) != self.torque:
+            self.torque = bool(command['torque'])
+            return  # A torque change is applied without moving
+
+        if self.torque:
+            self.start_pose = self.positions(now)
+            self.target = np.array(command['joints'], dtype=float)
+            self.move_start = now
+            self.move_dur = command['dur'] / 1000.0
+        if special == 2:
+            # Firmware records current + 10000 and position of the first two joints
+            pos = self.positions(now)
+            dxl = (pos[:2] * DXL_PER_DEG + 0.5).astype(int) + DXL_ZERO_OFFSET
+            self.recorded.extend([10000, int(dxl[0]), 10000, int(dxl[1])])
+
+    def _reply_values(self, values, now):
+        """Send a reply in the controller's 100-integer line format."""
+        values = list(values) + [0] * (100 - len(values))
+        self._reply(" ".join(map(str, values)) + " \n", now)
+
+    def _reply(self, text, now):
+        data = text.encode()
+        self._outgoing.append((self._link_time(len(data), now) + self.latency, data))
+
+    def _write(self, data):
+        try:
+            os.write(self._master, data)
+            self.counts['replies'] += 1
+        except (BlockingIOError, OSError):
+            self.counts['reply_overflows'] += 1  # Nobody is reading the port
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Q8bot controller and robot simulator')
+    parser.add_argument('--latency', type=float, default=0.0, help='One-way latency in seconds')
+    parser.add_argument('--loss', type=float, default=0.0, help='Command loss probability')
+    parser.add_argument('--baud', type=int, help='Link speed limit in bits/s')
+    parser.add_argument('--protocol', type=int, default=PROTOCOL_VERSIONS['delta'],
+                        help='Protocol version to report (0 = CSV-only firmware)')
+    args = parser.parse_args()
+
+    log = Q8Logger()
+    sim = Q8Simulator(args.latency, args.loss, args.baud, args.protocol)
+    sim.start()
+    log.info(f"Simulated controller on {sim.port}")
+    log.info(f"Run: {XiaoPortFinder.ENV_EXTRA_PORTS}={sim.port} python operate.py {sim.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    sim.stop()
+    log.info(f"Simulator counts: {sim.counts}")
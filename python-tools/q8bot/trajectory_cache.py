@@ -0,0 +1,99 @@
+'''
+On-disk cache for pre-calculated Q8bot gait trajectories.
+Each gait's full trajectory set (every direction) is stored as one .npz file,
+keyed by a hash of its GAITS entry and the kinematics solver geometry, so
+later launches and gait switches can skip the IK calculations entirely.
+'''
+
+import hashlib
+import os
+import numpy as np
+from helpers import Q8Logger
+
+# Bump when trajectory generation changes so stale files are not reused
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.q8bot', 'trajectory_cache')
+
+
+class TrajectoryCache:
+    """
+    Persistent store for gait trajectory sets.
+
+    Files are named after a hash of the gait parameters and the leg geometry,
+    so changing either one simply misses the cache instead of loading
+    trajectories computed for a different robot.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding the cached .npz files (created on first save)
+        """
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(leg, gait_params):
+        """
+        Build the cache key for a gait on a given leg.
+
+        Args:
+            leg: Kinematics solver instance
+            gait_params: [stacktype, x0, y0, xrange, yrange, yrange2, s1_count, s2_count]
+
+        Returns:
+            str: Hex digest identifying the trajectory set
+        """
+        geometry = (leg.d, leg.l1, leg.l2, leg.l1p, leg.l2p)
+        text = repr((CACHE_VERSION, tuple(gait_params), geometry))
+        return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+    def path(self, leg, gait_params):
+        """Get the file path used for a gait's trajectory set."""
+        return os.path.join(self.cache_dir, f"trajectories_{self.key(leg, gait_params)}.npz")
+
+    def load(self, leg, gait_params):
+        """
+        Load a cached trajectory set.
+
+        Args:
+            leg: Kinematics solver instance
+            gait_params: Gait parameter list from GAITS
+
+        Returns:
+            dict: Direction name to (n x 8) trajectory array, or None on a miss
+        """
+        path = self.path(leg, gait_params)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError, KeyError) as e:
+            Q8Logger.debug(f"Ignoring unreadable trajectory cache {path}: {e}")
+            return None
+
+    def save(self, leg, gait_params, trajectories):
+        """
+        Save a trajectory set. Failures are logged and otherwise ignored.
+
+        Args:
+            leg: Kinematics solver instance
+            gait_params: Gait parameter list from GAITS
+            trajectories: dict of direction name to (n x 8) trajectory array
+
+        Returns:
+            bool: True if the file was written
+        """
+        path = self.path(leg, gait_params)
+        tmp_path = path + '.tmp.npz'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.savez(tmp_path, **trajectories)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            Q8Logger.debug(f"Could not write trajectory cache {path}: {e}")
+            return False
+        return True